@@ -1,4 +1,5 @@
 import os
+from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -14,14 +15,38 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME", "auto_chatbot_db")
 
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 disables
+# Pre-ping costs one extra round-trip per checkout; enable it where idle connections get cut
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# asyncpg prepared statements cached per connection (set 0 behind pgbouncer in transaction mode)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
 # Create async database URL
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = URL.create(
+    "postgresql+asyncpg",
+    username=DB_USER,
+    password=DB_PASSWORD,
+    host=DB_HOST,
+    port=int(DB_PORT),
+    database=DB_NAME,
+    query={"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)},
+)
 
 # Create async engine
 engine = create_async_engine(
     DATABASE_URL,
     echo=False,  # Set to True for SQL query logging
     future=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
 )
 
 # Create async session factory
@@ -39,12 +64,23 @@ Base = declarative_base()
 # Database dependency
 async def get_db():
     """
-    Dependency function that yields an async database session
+    Dependency function that yields an async database session.
+
+    Unit of work: handlers add/flush but don't commit; the request's single
+    transaction is committed here once the handler returns, or rolled back
+    if it raised. Handlers that must act after their commit (invalidating
+    session_cache entries, streaming, starting a job) commit themselves first.
+
+    Declare it as Depends(get_db, scope="function"): the default request
+    scope runs this teardown only after the response (and BackgroundTasks)
+    went out, so clients could see data that isn't committed yet and a
+    failed commit would never reach them.
     """
     async with AsyncSessionLocal() as session:
         try:
             yield session
-            await session.commit()
+            if session.in_transaction():
+                await session.commit()
         except Exception:
             await session.rollback()
-            raise
\ No newline at end of file
+            raise
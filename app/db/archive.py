@@ -0,0 +1,225 @@
+"""
+Message partitions and cold-session archival.
+
+messages is range-partitioned by UTC month on timestamp (migration 6).
+maintain() keeps partitions created ahead of the clock, archives idle sessions
+and drops the monthly partitions archival has emptied, so the hot table and
+its indexes only hold live conversations and vacuum never revisits old months.
+
+A session with no message (and no restore) for SESSION_ARCHIVE_AFTER_DAYS is
+compacted into one session_archives row holding its messages (and their
+recommended products) as zlib-compressed JSON, and the rows leave messages.
+restore_session puts them back, with their original ids and timestamps, when
+the session is opened again.
+
+CLI:  python -m app.db.archive     (one maintenance pass)
+"""
+import os
+import re
+import json
+import zlib
+import asyncio
+import logging
+from datetime import datetime, date, timezone, timedelta
+from typing import Optional
+from sqlalchemy import delete, update, insert, exists, and_, or_, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.future import select
+
+from app.database import AsyncSessionLocal, engine
+from app.models import ChatSession, Message, MessageProduct, SessionArchive
+from app.session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+# Archival settings (overridable via environment)
+SESSION_ARCHIVE_AFTER_DAYS = int(os.getenv("SESSION_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "100"))                   # sessions per transaction
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "2"))
+PARTITION_LOCK_TIMEOUT = os.getenv("PARTITION_LOCK_TIMEOUT", "2s")
+
+_PARTITION_NAME = re.compile(r"^messages_p(\d{4})_(\d{2})$")
+# Message columns kept in an archive, in insert order
+_COLUMNS = ("id", "role", "content", "timestamp", "car_image")
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _cutoff():
+    return _now() - timedelta(days=SESSION_ARCHIVE_AFTER_DAYS)
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def _pack(rows: list) -> bytes:
+    return zlib.compress(json.dumps(
+        [{**row, "timestamp": row["timestamp"].isoformat()} for row in rows]
+    ).encode())
+
+def _unpack(payload: bytes) -> list:
+    rows = []
+    for row in json.loads(zlib.decompress(payload)):
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        # Archives written before message_products hold the old JSON text column
+        legacy = row.pop("products", None)
+        if legacy and "recommendations" not in row:
+            row["recommendations"] = [[p["id"], p.get("score")] for p in json.loads(legacy) if p.get("id")]
+        rows.append(row)
+    return rows
+
+async def ensure_partitions(months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """Create this month's partition and the next `months_ahead` ones if missing."""
+    month = _now().date().replace(day=1)
+    for _ in range(months_ahead + 1):
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+                await conn.execute(text("SELECT messages_ensure_partition(:month)"), {"month": month})
+        except DBAPIError as e:
+            # Rows keep landing in messages_default meanwhile; the next pass moves them
+            logger.warning(f"Could not create messages partition for {month:%Y-%m}: {e.__class__.__name__}")
+        month = _next_month(month)
+
+async def archive_idle_sessions(cutoff: Optional[datetime] = None) -> int:
+    """Move idle sessions' messages into session_archives. Returns sessions archived."""
+    cutoff = cutoff or _cutoff()
+    archived = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            # Row locks keep new messages (FK check) and restores out until the batch commits;
+            # SKIP LOCKED lets several workers share the work
+            ids = list((await db.execute(
+                select(ChatSession.id)
+                .where(
+                    ChatSession.archived_at.is_(None),
+                    ChatSession.created_at < cutoff,
+                    or_(ChatSession.restored_at.is_(None), ChatSession.restored_at < cutoff),
+                    ~exists().where(Message.session_id == ChatSession.id, Message.timestamp >= cutoff),
+                )
+                .order_by(ChatSession.created_at, ChatSession.id)
+                .limit(ARCHIVE_BATCH)
+                .with_for_update(skip_locked=True)
+            )).scalars())
+            if not ids:
+                break
+
+            rows = await db.execute(
+                select(Message.session_id, *(getattr(Message, c) for c in _COLUMNS))
+                .where(Message.session_id.in_(ids), Message.timestamp < cutoff)
+                .order_by(Message.session_id, Message.timestamp, Message.id)
+            )
+            by_session = {session_id: [] for session_id in ids}
+            by_id = {}
+            for row in rows.mappings():
+                message = {c: row[c] for c in _COLUMNS}
+                message["recommendations"] = []
+                by_session[row["session_id"]].append(message)
+                by_id[row["id"]] = message
+
+            recs = await db.execute(
+                select(MessageProduct.message_id, MessageProduct.product_id, MessageProduct.score)
+                .join(Message, and_(
+                    Message.id == MessageProduct.message_id, Message.timestamp == MessageProduct.message_timestamp
+                ))
+                .where(Message.session_id.in_(ids), Message.timestamp < cutoff)
+                .order_by(MessageProduct.message_id, MessageProduct.rank)
+            )
+            for message_id, product_id, score in recs.all():
+                by_id[message_id]["recommendations"].append([product_id, score])
+
+            now = _now()
+            db.add_all(
+                SessionArchive(
+                    session_id=session_id,
+                    message_count=len(messages),
+                    last_message=messages[-1]["content"] if messages else None,
+                    payload=_pack(messages),
+                    archived_at=now,
+                )
+                for session_id, messages in by_session.items()
+            )
+            # Same bound as the read, so nothing written since is dropped unarchived;
+            # message_products rows go with their messages (ON DELETE CASCADE)
+            await db.execute(
+                delete(Message).where(Message.session_id.in_(ids), Message.timestamp < cutoff)
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(update(ChatSession).where(ChatSession.id.in_(ids)).values(archived_at=now))
+            await db.commit()
+        session_cache.invalidate(*ids)
+        archived += len(ids)
+    return archived
+
+async def restore_session(db, session_id: str) -> int:
+    """
+    Put an archived session's messages back into the hot table, in the
+    caller's transaction. Returns messages restored (0 if another request
+    restored it first).
+    """
+    # Deleting the archive row first serializes concurrent restores of one session
+    payload = (await db.execute(
+        delete(SessionArchive).where(SessionArchive.session_id == session_id).returning(SessionArchive.payload)
+    )).scalar()
+    await db.execute(
+        update(ChatSession).where(ChatSession.id == session_id).values(archived_at=None, restored_at=_now())
+    )
+    if payload is None:
+        return 0
+    rows = _unpack(payload)
+    recommendations = [
+        {"message_id": row["id"], "message_timestamp": row["timestamp"], "rank": rank, "product_id": product_id, "score": score}
+        for row in rows
+        for rank, (product_id, score) in enumerate(row.pop("recommendations", []), 1)
+    ]
+    if rows:
+        await db.execute(insert(Message), [{"session_id": session_id, **row} for row in rows])
+    if recommendations:
+        await db.execute(insert(MessageProduct), recommendations)
+    logger.info(f"Restored {len(rows)} archived messages for session {session_id}")
+    return len(rows)
+
+async def drop_empty_partitions(cutoff: Optional[datetime] = None) -> list:
+    """Detach and drop monthly partitions that ended before `cutoff` and hold no rows."""
+    cutoff = cutoff or _cutoff()
+    async with engine.connect() as conn:
+        names = (await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'messages'::regclass"
+        ))).scalars().all()
+
+    dropped = []
+    for name in sorted(names):
+        match = _PARTITION_NAME.match(name)
+        if not match or _next_month(date(int(match[1]), int(match[2]), 1)) > cutoff.date():
+            continue
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+                # Locked before the check so no restore can slip a row in before the drop
+                await conn.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+                if await conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {name})")):
+                    continue
+                await conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+                await conn.execute(text(f"DROP TABLE {name}"))
+        except DBAPIError as e:
+            logger.info(f"Partition {name} not dropped ({e.__class__.__name__}); retrying next pass")
+            continue
+        dropped.append(name)
+    return dropped
+
+async def maintain():
+    """One maintenance pass: partitions ahead, idle sessions archived, emptied months dropped."""
+    await ensure_partitions()
+    archived = await archive_idle_sessions()
+    dropped = await drop_empty_partitions()
+    logger.info(f"History maintenance: {archived} sessions archived, partitions dropped: {dropped or 'none'}")
+    return {"archived_sessions": archived, "dropped_partitions": dropped}
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def main():
+        print(await maintain())
+        await engine.dispose()
+
+    asyncio.run(main())
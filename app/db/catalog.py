@@ -0,0 +1,207 @@
+"""
+Bulk product catalog loader.
+
+Streams a catalog CSV (e.g. a PakWheels export) in chunks, cleans each chunk
+with vectorized pandas ops and COPYs it into a temporary staging table. The
+staging rows are then diffed against `products` in the same transaction:
+rows are matched on the natural key (url, or title+manufacturer when a
+product has no url) and compared by content hash, so only new and changed
+products are written and, in replace mode, products missing from the file
+are deleted. Readers see either the old catalog or the new one, never a
+half-loaded table, and existing product ids survive a reload.
+
+Every insert, update and delete is logged to catalog_changes; the
+recommender folds those into its index incrementally (see
+app.recommend.recommend.sync_index) instead of refitting.
+
+CLI:  python -m app.db.catalog data/pakwheels_products.csv [--chunk-size 20000] [--keep-missing]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv("CATALOG_CHUNK_SIZE", "20000"))
+# catalog_changes entries older than this are pruned at the end of each load
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv("CATALOG_CHANGE_LOG_RETENTION_DAYS", "30"))
+
+# Staging columns, in COPY order
+_COLUMNS = ["natural_key", "title", "details", "manufacturer", "price", "url"]
+
+# CSV header (case-insensitive) -> products column
+_CSV_COLUMNS = {"title": "title", "details": "details", "manufacturer": "manufacturer", "price": "price", "url": "url"}
+
+def natural_key(title: pd.Series, manufacturer: pd.Series, url: pd.Series) -> pd.Series:
+    """A product's identity across catalog loads: its url, else lowercased title|manufacturer."""
+    fallback = title.str.strip().str.lower() + "|" + manufacturer.str.strip().str.lower()
+    return url.where(url != "", fallback)
+
+def parse_prices(price: pd.Series) -> pd.Series:
+    """
+    'PKR 1,250' / 'Rs. 900' / '1250.0' / 1250 -> 1250 / 900 / 1250 / 1250;
+    anything unparseable -> NaN. The currency prefix goes first, so the dot
+    in 'Rs.' isn't read as a decimal point.
+    """
+    digits = (
+        price.astype(str).str.strip()
+        .str.replace(r"^\D+", "", regex=True)
+        .str.replace(r"[^\d.]", "", regex=True)
+    )
+    return pd.to_numeric(digits, errors="coerce").round()
+
+def clean_chunk(df: pd.DataFrame) -> tuple:
+    """
+    Normalize one CSV chunk into staging records.
+    Returns (records, rows skipped for a missing title or price).
+    """
+    df = df.rename(columns=lambda c: _CSV_COLUMNS.get(c.strip().lower(), c))
+    for col in ("title", "details", "manufacturer", "url"):
+        df[col] = df[col].fillna("").astype(str).str.strip() if col in df else ""
+
+    df["price"] = parse_prices(df["price"]) if "price" in df else float("nan")
+    keep = df["price"].notna() & (df["title"] != "")
+    df = df[keep]
+    df = df.assign(
+        price=df["price"].astype("int64"),
+        natural_key=natural_key(df["title"], df["manufacturer"], df["url"]),
+    )
+    # Empty optional fields are stored as NULL
+    out = df[_COLUMNS].astype(object)
+    for col in ("details", "manufacturer", "url"):
+        out[col] = out[col].mask(out[col] == "", None)
+
+    records = list(out.itertuples(index=False, name=None))
+    return records, int((~keep).sum())
+
+# Content hash of a products/staging row. Must match migration 4's backfill.
+ROW_HASH = (
+    "md5(concat_ws(chr(31), title, COALESCE(details, ''), COALESCE(manufacturer, ''), "
+    "price::text, COALESCE(url, '')))"
+)
+
+# Upsert new and changed rows only (unchanged hashes are skipped without a write)
+# and log each one to catalog_changes
+_MERGE = f"""
+    WITH upserted AS (
+        INSERT INTO products (id, natural_key, title, details, manufacturer, price, url, row_hash)
+        SELECT gen_random_uuid()::text, natural_key, title, details, manufacturer, price, url, {ROW_HASH}
+        FROM (
+            -- A key repeated in the file: the last occurrence wins
+            SELECT DISTINCT ON (natural_key) *
+            FROM products_staging
+            ORDER BY natural_key, seq DESC
+        ) s
+        ON CONFLICT (natural_key) DO UPDATE SET
+            title = EXCLUDED.title,
+            details = EXCLUDED.details,
+            manufacturer = EXCLUDED.manufacturer,
+            price = EXCLUDED.price,
+            url = EXCLUDED.url,
+            row_hash = EXCLUDED.row_hash
+        WHERE products.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+        -- xmax is 0 only on freshly inserted tuples
+        RETURNING id, CASE WHEN xmax = 0 THEN 'I' ELSE 'U' END AS op
+    )
+    INSERT INTO catalog_changes (product_id, op)
+    SELECT id, op FROM upserted
+    RETURNING op
+"""
+
+_DELETE_MISSING = """
+    WITH deleted AS (
+        DELETE FROM products p
+        WHERE NOT EXISTS (SELECT 1 FROM products_staging s WHERE s.natural_key = p.natural_key)
+        RETURNING id
+    )
+    INSERT INTO catalog_changes (product_id, op)
+    SELECT id, 'D' FROM deleted
+    RETURNING op
+"""
+
+async def load_catalog(engine, csv_file: str, chunk_size: int = CHUNK_SIZE, replace: bool = True) -> dict:
+    """
+    Load `csv_file` into the products table (see module docstring).
+    With replace=False, products absent from the file are kept.
+    Returns load statistics.
+    """
+    start = time.perf_counter()
+    stats = {"rows": 0, "skipped": 0, "inserted": 0, "updated": 0, "deleted": 0}
+
+    async with engine.connect() as conn:
+        # asyncpg connection underneath, for COPY
+        raw = (await conn.get_raw_connection()).driver_connection
+        async with raw.transaction():
+            await raw.execute("""
+                CREATE TEMP TABLE products_staging (
+                    seq BIGSERIAL,
+                    natural_key VARCHAR NOT NULL,
+                    title VARCHAR NOT NULL,
+                    details TEXT,
+                    manufacturer VARCHAR,
+                    price INTEGER NOT NULL,
+                    url VARCHAR
+                ) ON COMMIT DROP
+            """)
+
+            reader = pd.read_csv(csv_file, chunksize=chunk_size, dtype=str, keep_default_na=False)
+            while True:
+                # Parse the next chunk off the event loop
+                df = await asyncio.to_thread(next, reader, None)
+                if df is None:
+                    break
+                records, skipped = await asyncio.to_thread(clean_chunk, df)
+                await raw.copy_records_to_table("products_staging", records=records, columns=_COLUMNS)
+                stats["rows"] += len(records)
+                stats["skipped"] += skipped
+                elapsed = time.perf_counter() - start
+                logger.info(f"Staged {stats['rows']} products ({stats['rows'] / elapsed:.0f} rows/s)")
+
+            if replace and not stats["rows"]:
+                # Rolls back: an empty or unreadable export must not wipe the catalog
+                raise ValueError(f"No valid products in {csv_file}")
+
+            await raw.execute("CREATE INDEX ON products_staging (natural_key)")
+            await raw.execute("ANALYZE products_staging")
+            for row in await raw.fetch(_MERGE):
+                stats["inserted" if row["op"] == "I" else "updated"] += 1
+            if replace:
+                stats["deleted"] = len(await raw.fetch(_DELETE_MISSING))
+
+            await raw.execute(
+                "DELETE FROM catalog_changes WHERE changed_at < now() - make_interval(days => $1)",
+                CHANGE_LOG_RETENTION_DAYS,
+            )
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    stats["rows_per_sec"] = round(stats["rows"] / stats["seconds"]) if stats["seconds"] else None
+    return stats
+
+if __name__ == "__main__":
+    from app.database import engine
+    from app.db.migrations import run_migrations
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("csv_file")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--keep-missing", action="store_true", help="don't delete products absent from the file")
+    args = parser.parse_args()
+
+    async def main():
+        await run_migrations(engine)
+        stats = await load_catalog(engine, args.csv_file, args.chunk_size, replace=not args.keep_missing)
+        await engine.dispose()
+        return stats
+
+    try:
+        stats = asyncio.run(main())
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Loaded {stats['rows']} products ({stats['skipped']} skipped) in {stats['seconds']}s "
+          f"({stats['rows_per_sec']} rows/s): {stats['inserted']} inserted, {stats['updated']} updated, {stats['deleted']} removed")
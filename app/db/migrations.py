@@ -0,0 +1,352 @@
+"""
+Versioned schema migrations for the chat database.
+
+Each migration is (version, name, [SQL statements]). Pending ones are applied
+in order at startup, inside one transaction guarded by an advisory lock so
+concurrent workers don't race, and recorded in schema_migrations.
+Append new migrations to the end; never edit an applied one.
+
+CLI:  python -m app.db.migrations [status]
+"""
+import sys
+import asyncio
+import logging
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary app-wide key for pg_advisory_xact_lock
+_LOCK_KEY = 472_310_001
+
+MIGRATIONS = [
+    (1, "baseline schema", [
+        # IF NOT EXISTS so databases created by the old create_all adopt this history as-is
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id VARCHAR PRIMARY KEY,
+            title VARCHAR NOT NULL,
+            details TEXT,
+            manufacturer VARCHAR,
+            price INTEGER NOT NULL,
+            url VARCHAR
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id VARCHAR PRIMARY KEY,
+            user_id VARCHAR NOT NULL,
+            manufacturer VARCHAR NOT NULL,
+            model VARCHAR NOT NULL,
+            year INTEGER NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE,
+            text_size VARCHAR
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id SERIAL PRIMARY KEY,
+            session_id VARCHAR NOT NULL REFERENCES chat_sessions (id) ON DELETE CASCADE,
+            role VARCHAR NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE,
+            car_image VARCHAR,
+            products TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS session_summaries (
+            session_id VARCHAR PRIMARY KEY REFERENCES chat_sessions (id) ON DELETE CASCADE,
+            content TEXT NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE
+        )
+        """,
+    ]),
+    (2, "chat access-path indexes", [
+        # Transcript, chat context and keyset pages scan this in either direction.
+        # The trailing left(content, 120) column is dropped by migration 9.
+        """
+        CREATE INDEX IF NOT EXISTS ix_messages_session_ts
+            ON messages (session_id, timestamp, id, left(content, 120))
+        """,
+        # History list, newest first, keyset on (created_at, id)
+        """
+        CREATE INDEX IF NOT EXISTS ix_chat_sessions_created_at
+            ON chat_sessions (created_at, id)
+        """,
+    ]),
+    (3, "product natural key", [
+        # Catalog loads upsert on this (see app/db/catalog.py): url, else title|manufacturer
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS natural_key VARCHAR",
+        """
+        UPDATE products
+        SET natural_key = COALESCE(NULLIF(url, ''), lower(trim(title)) || '|' || lower(trim(COALESCE(manufacturer, ''))))
+        WHERE natural_key IS NULL
+        """,
+        # Older delete-and-reinsert loads could leave the same product twice; keep one
+        """
+        DELETE FROM products p USING products q
+        WHERE p.natural_key = q.natural_key AND p.id > q.id
+        """,
+        "ALTER TABLE products ALTER COLUMN natural_key SET NOT NULL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_products_natural_key ON products (natural_key)",
+    ]),
+    (4, "catalog row hashes and change log", [
+        # Same expression as app.db.catalog.ROW_HASH; catalog syncs compare it to skip unchanged rows
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS row_hash VARCHAR(32)",
+        """
+        UPDATE products
+        SET row_hash = md5(concat_ws(chr(31), title, COALESCE(details, ''), COALESCE(manufacturer, ''), price::text, COALESCE(url, '')))
+        WHERE row_hash IS NULL
+        """,
+        # One row per product inserted/updated/deleted by a catalog sync; the recommender
+        # folds entries past its index's change_id in incrementally
+        """
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            id BIGSERIAL PRIMARY KEY,
+            product_id VARCHAR NOT NULL,
+            op CHAR(1) NOT NULL,
+            changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_catalog_changes_changed_at ON catalog_changes (changed_at)",
+    ]),
+    (5, "history purge jobs", [
+        # Background clear-history jobs (see app/db/purge.py)
+        """
+        CREATE TABLE IF NOT EXISTS purge_jobs (
+            id VARCHAR PRIMARY KEY,
+            user_id VARCHAR,
+            status VARCHAR NOT NULL,
+            method VARCHAR,
+            sessions_deleted INTEGER NOT NULL DEFAULT 0,
+            messages_deleted INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            finished_at TIMESTAMP WITH TIME ZONE
+        )
+        """,
+        # Per-user purges pick their sessions by owner
+        "CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_id ON chat_sessions (user_id, id)",
+    ]),
+    (6, "monthly message partitions and session archives", [
+        # Rebuild messages as a table range-partitioned by month on timestamp
+        # (see app/db/archive.py). The primary key has to include the partition
+        # key; ids still come from the same sequence, so they stay unique.
+        "ALTER TABLE messages RENAME TO messages_unpartitioned",
+        "ALTER INDEX IF EXISTS messages_pkey RENAME TO messages_unpartitioned_pkey",
+        "DROP INDEX IF EXISTS ix_messages_session_ts",
+        "ALTER SEQUENCE messages_id_seq OWNED BY NONE",
+        """
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            session_id VARCHAR NOT NULL REFERENCES chat_sessions (id) ON DELETE CASCADE,
+            role VARCHAR NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            car_image VARCHAR,
+            products TEXT,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        """,
+        "ALTER SEQUENCE messages_id_seq OWNED BY messages.id",
+        # Catches rows outside every monthly partition (e.g. restored archives of dropped months)
+        "CREATE TABLE messages_default PARTITION OF messages DEFAULT",
+        # Creates the partition for one UTC month, first moving any rows for that
+        # month out of messages_default (attaching fails while they're there)
+        """
+        CREATE OR REPLACE FUNCTION messages_ensure_partition(p_month date) RETURNS void
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            part text := 'messages_p' || to_char(p_month, 'YYYY_MM');
+            low timestamptz := p_month::timestamp AT TIME ZONE 'UTC';
+            high timestamptz := (p_month + interval '1 month') AT TIME ZONE 'UTC';
+        BEGIN
+            IF to_regclass(part) IS NOT NULL THEN
+                RETURN;
+            END IF;
+            EXECUTE format('CREATE TABLE %I (LIKE messages INCLUDING DEFAULTS)', part);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM messages_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved', low, high, part);
+            EXECUTE format('ALTER TABLE messages ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, low, high);
+        END $$
+        """,
+        """
+        DO $$
+        DECLARE
+            m date;
+        BEGIN
+            FOR m IN SELECT generate_series(
+                date_trunc('month', COALESCE((SELECT min(timestamp) FROM messages_unpartitioned), now()) AT TIME ZONE 'UTC'),
+                date_trunc('month', now() AT TIME ZONE 'UTC') + interval '2 months',
+                interval '1 month'
+            )::date
+            LOOP
+                PERFORM messages_ensure_partition(m);
+            END LOOP;
+        END $$
+        """,
+        """
+        INSERT INTO messages (id, session_id, role, content, timestamp, car_image, products)
+        SELECT id, session_id, role, content, COALESCE(timestamp, now()), car_image, products
+        FROM messages_unpartitioned
+        """,
+        "DROP TABLE messages_unpartitioned",
+        # Same as migration 2; created on the parent, so every partition gets it
+        """
+        CREATE INDEX IF NOT EXISTS ix_messages_session_ts
+            ON messages (session_id, timestamp, id, left(content, 120))
+        """,
+        # Idle sessions are compacted into one compressed row here and their
+        # messages leave the hot table; restored on open
+        "ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITH TIME ZONE",
+        "ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS restored_at TIMESTAMP WITH TIME ZONE",
+        """
+        CREATE TABLE IF NOT EXISTS session_archives (
+            session_id VARCHAR PRIMARY KEY REFERENCES chat_sessions (id) ON DELETE CASCADE,
+            message_count INTEGER NOT NULL,
+            last_message VARCHAR,
+            payload BYTEA NOT NULL,
+            archived_at TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+        """,
+        # Archival candidates: only sessions still in the hot table
+        """
+        CREATE INDEX IF NOT EXISTS ix_chat_sessions_unarchived
+            ON chat_sessions (created_at, id) WHERE archived_at IS NULL
+        """,
+    ]),
+    (7, "message product recommendations", [
+        # One row per product recommended on an assistant message, replacing the
+        # JSON text in messages.products. The FK includes timestamp because
+        # messages is partitioned on it; rows leave with their message.
+        # product_id has no FK: catalog syncs delete products, history keeps the id.
+        """
+        CREATE TABLE IF NOT EXISTS message_products (
+            message_id INTEGER NOT NULL,
+            message_timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            rank SMALLINT NOT NULL,
+            product_id VARCHAR NOT NULL,
+            score REAL,
+            PRIMARY KEY (message_id, rank),
+            FOREIGN KEY (message_id, message_timestamp) REFERENCES messages (id, timestamp) ON DELETE CASCADE
+        )
+        """,
+        """
+        INSERT INTO message_products (message_id, message_timestamp, rank, product_id, score)
+        SELECT m.id, m.timestamp, p.rank, p.item->>'id', (p.item->>'score')::real
+        FROM messages m, jsonb_array_elements(m.products::jsonb) WITH ORDINALITY AS p (item, rank)
+        WHERE m.products IS NOT NULL AND p.item->>'id' IS NOT NULL
+        ON CONFLICT DO NOTHING
+        """,
+        "ALTER TABLE messages DROP COLUMN IF EXISTS products",
+        # "Most recommended products since ..." reads a range of this index only
+        """
+        CREATE INDEX IF NOT EXISTS ix_message_products_recent
+            ON message_products (message_timestamp, product_id)
+        """,
+    ]),
+    (8, "keep recommendations when moving default-partition messages", [
+        # Moving a month's rows out of messages_default deletes them there, which
+        # cascades to message_products; keep a copy and put it back once the
+        # rows are in the attached partition (see scripts/check_partition_move.py)
+        """
+        CREATE OR REPLACE FUNCTION messages_ensure_partition(p_month date) RETURNS void
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            part text := 'messages_p' || to_char(p_month, 'YYYY_MM');
+            low timestamptz := p_month::timestamp AT TIME ZONE 'UTC';
+            high timestamptz := (p_month + interval '1 month') AT TIME ZONE 'UTC';
+        BEGIN
+            IF to_regclass(part) IS NOT NULL THEN
+                RETURN;
+            END IF;
+            DROP TABLE IF EXISTS moved_message_products;
+            CREATE TEMP TABLE moved_message_products (LIKE message_products) ON COMMIT DROP;
+            -- Without a partition for the month, all of its messages are in messages_default
+            INSERT INTO moved_message_products
+                SELECT * FROM message_products WHERE message_timestamp >= low AND message_timestamp < high;
+
+            EXECUTE format('CREATE TABLE %I (LIKE messages INCLUDING DEFAULTS)', part);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM messages_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved', low, high, part);
+            EXECUTE format('ALTER TABLE messages ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, low, high);
+
+            INSERT INTO message_products SELECT * FROM moved_message_products;
+            DROP TABLE moved_message_products;
+        END $$
+        """,
+    ]),
+    (9, "messages session index without the preview expression", [
+        # left(content, 120) never made the latest-message lookup index-only
+        # (content is still read to evaluate it, and the history list now shows
+        # the whole message); it only made the index larger
+        "DROP INDEX IF EXISTS ix_messages_session_ts",
+        """
+        CREATE INDEX IF NOT EXISTS ix_messages_session_ts
+            ON messages (session_id, timestamp, id)
+        """,
+    ]),
+    (10, "history keyset index for sessions without created_at", [
+        # The history list orders on created_at with NULL as the epoch so its
+        # cursor always has a value; must match app.queries.NULL_CREATED_AT
+        """
+        CREATE INDEX IF NOT EXISTS ix_chat_sessions_created_at_coalesced
+            ON chat_sessions ((COALESCE(created_at, '1970-01-01T00:00:00+00:00'::timestamptz)), id)
+        """,
+    ]),
+]
+
+async def run_migrations(engine) -> list:
+    """Apply pending migrations. Returns the versions applied."""
+    applied_now = []
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+            "applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())"
+        ))
+        done = set((await conn.execute(text("SELECT version FROM schema_migrations"))).scalars())
+
+        for version, name, statements in MIGRATIONS:
+            if version in done:
+                continue
+            logger.info(f"Applying migration {version}: {name}")
+            for statement in statements:
+                await conn.execute(text(statement))
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                {"version": version, "name": name},
+            )
+            applied_now.append(version)
+
+    logger.info(f"Database schema at version {MIGRATIONS[-1][0]} ({len(applied_now)} migrations applied)")
+    return applied_now
+
+async def _status(engine):
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT version, name, applied_at FROM schema_migrations ORDER BY version"
+        ))).all()
+    done = {row[0] for row in rows}
+    for row in rows:
+        print(f"  {row[0]:>4}  {row[1]:<40} applied {row[2]:%Y-%m-%d %H:%M}")
+    for version, name, _ in MIGRATIONS:
+        if version not in done:
+            print(f"  {version:>4}  {name:<40} pending")
+
+if __name__ == "__main__":
+    from app.database import engine
+
+    async def main():
+        if sys.argv[1:] == ["status"]:
+            await _status(engine)
+        else:
+            await run_migrations(engine)
+        await engine.dispose()
+
+    asyncio.run(main())
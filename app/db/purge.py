@@ -0,0 +1,185 @@
+"""
+Background clear-history jobs.
+
+A purge is recorded in purge_jobs and run off the request path. A full purge
+(no user scope) first tries TRUNCATE, which is instant but needs a brief
+exclusive lock; if that lock isn't granted within PURGE_LOCK_TIMEOUT it falls
+back to the batched path. The batched path deletes a few sessions at a time,
+their messages in bounded chunks, each chunk in its own short transaction, so
+chat requests never wait behind one long delete.
+
+Only sessions created before the job are purged by the batched path, so
+conversations started meanwhile survive. Jobs left running by a dead worker
+are picked up again at startup (resume_jobs); every step is idempotent.
+"""
+import os
+import asyncio
+import logging
+import traceback
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+from sqlalchemy import delete, update, or_, text
+from sqlalchemy.future import select
+
+from app.database import AsyncSessionLocal, engine
+from app.models import ChatSession, Message, SessionSummary, PurgeJob
+from app.session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+# Purge settings (overridable via environment)
+PURGE_SESSION_BATCH = int(os.getenv("PURGE_SESSION_BATCH", "200"))
+PURGE_MESSAGE_BATCH = int(os.getenv("PURGE_MESSAGE_BATCH", "5000"))
+PURGE_BATCH_PAUSE = float(os.getenv("PURGE_BATCH_PAUSE", "0.05"))    # seconds between batches
+PURGE_LOCK_TIMEOUT = os.getenv("PURGE_LOCK_TIMEOUT", "2s")
+# A running job whose heartbeat is older than this is considered abandoned
+PURGE_STALE_AFTER = timedelta(seconds=int(os.getenv("PURGE_STALE_AFTER", "300")))
+
+# Jobs running in this process, so they aren't garbage-collected mid-flight
+_tasks = set()
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+async def create_job(db, user_id: Optional[str] = None) -> PurgeJob:
+    """Record a pending purge; the caller commits, then calls start_job."""
+    now = _now()
+    job = PurgeJob(user_id=user_id, status="pending", created_at=now, updated_at=now)
+    db.add(job)
+    await db.flush()
+    return job
+
+def start_job(job_id: str):
+    """Run a committed job in the background of this process."""
+    task = asyncio.create_task(run_job(job_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+async def _claim(job_id: str) -> Optional[PurgeJob]:
+    # Atomic, so two workers resuming the same job can't both run it
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(
+            update(PurgeJob)
+            .where(
+                PurgeJob.id == job_id,
+                or_(
+                    PurgeJob.status == "pending",
+                    (PurgeJob.status == "running") & (PurgeJob.updated_at < _now() - PURGE_STALE_AFTER),
+                ),
+            )
+            .values(status="running", updated_at=_now())
+            .returning(PurgeJob)
+        )
+        job = res.scalars().first()
+        await db.commit()
+        return job
+
+async def _progress(job_id: str, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(PurgeJob).where(PurgeJob.id == job_id).values(updated_at=_now(), **values))
+        await db.commit()
+
+async def run_job(job_id: str):
+    job = await _claim(job_id)
+    if job is None:
+        return
+    logger.info(f"Purge job {job_id} started (user: {job.user_id or 'all'})")
+    try:
+        if job.user_id is None and await _truncate(job_id):
+            return
+        await _purge_batched(job)
+    except Exception:
+        logger.error(f"Purge job {job_id} failed:\n" + traceback.format_exc())
+        await _progress(job_id, status="failed", error=traceback.format_exc().strip().splitlines()[-1], finished_at=_now())
+
+async def _truncate(job_id: str) -> bool:
+    """TRUNCATE everything if the lock is granted quickly; False to fall back to batches."""
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{PURGE_LOCK_TIMEOUT}'"))
+            # Planner estimates: an exact count(*) would scan the very tables being dropped.
+            # messages is partitioned and its parent holds no rows, so its partitions are summed
+            sessions, messages = (await conn.execute(text(
+                "SELECT (SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'chat_sessions'::regclass), "
+                "(SELECT COALESCE(sum(GREATEST(c.reltuples, 0)), 0)::bigint FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'messages'::regclass)"
+            ))).one()
+            await conn.execute(text("TRUNCATE session_summaries, session_archives, message_products, messages, chat_sessions"))
+    except Exception as e:
+        logger.info(f"Purge job {job_id}: TRUNCATE not possible ({e.__class__.__name__}), deleting in batches")
+        return False
+    session_cache.clear()
+    await _progress(job_id, status="done", method="truncate", sessions_deleted=sessions,
+                    messages_deleted=messages, finished_at=_now())
+    logger.info(f"Purge job {job_id} done by TRUNCATE ({sessions} sessions, {messages} messages)")
+    return True
+
+async def _purge_batched(job: PurgeJob):
+    await _progress(job.id, method="batched")
+    sessions_deleted, messages_deleted = job.sessions_deleted, job.messages_deleted
+
+    scope = [or_(ChatSession.created_at.is_(None), ChatSession.created_at <= job.created_at)]
+    if job.user_id is not None:
+        scope.append(ChatSession.user_id == job.user_id)
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            ids = list((await db.execute(
+                select(ChatSession.id).where(*scope).order_by(ChatSession.id).limit(PURGE_SESSION_BATCH)
+            )).scalars())
+        if not ids:
+            break
+
+        # Messages first, in bounded chunks, so no single statement holds many row locks
+        while True:
+            async with AsyncSessionLocal() as db:
+                res = await db.execute(
+                    delete(Message).where(Message.id.in_(
+                        select(Message.id).where(Message.session_id.in_(ids)).limit(PURGE_MESSAGE_BATCH)
+                    )).execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            messages_deleted += res.rowcount
+            if res.rowcount < PURGE_MESSAGE_BATCH:
+                break
+            await asyncio.sleep(PURGE_BATCH_PAUSE)
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(SessionSummary).where(SessionSummary.session_id.in_(ids)))
+            # Cascades any message written to these sessions since the chunks above
+            res = await db.execute(delete(ChatSession).where(ChatSession.id.in_(ids)))
+            await db.commit()
+        session_cache.invalidate(*ids)
+        sessions_deleted += res.rowcount
+
+        await _progress(job.id, sessions_deleted=sessions_deleted, messages_deleted=messages_deleted)
+        await asyncio.sleep(PURGE_BATCH_PAUSE)
+
+    await _progress(job.id, status="done", sessions_deleted=sessions_deleted,
+                    messages_deleted=messages_deleted, finished_at=_now())
+    logger.info(f"Purge job {job.id} done ({sessions_deleted} sessions, {messages_deleted} messages)")
+
+async def resume_jobs():
+    """Start pending jobs and abandoned running ones (call at startup)."""
+    async with AsyncSessionLocal() as db:
+        ids = (await db.execute(
+            select(PurgeJob.id).where(or_(
+                PurgeJob.status == "pending",
+                (PurgeJob.status == "running") & (PurgeJob.updated_at < _now() - PURGE_STALE_AFTER),
+            ))
+        )).scalars().all()
+    for job_id in ids:
+        start_job(job_id)
+
+def job_dict(job: PurgeJob) -> dict:
+    return {
+        "job_id": job.id,
+        "user_id": job.user_id,
+        "status": job.status,
+        "method": job.method,
+        "sessions_deleted": job.sessions_deleted,
+        "messages_deleted": job.messages_deleted,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,121 @@
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Upload settings (overridable via environment); UPLOAD_DIR must sit under static/ to be served
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "static/uploads")
+UPLOAD_URL_PREFIX = "/" + UPLOAD_DIR.strip("/") + "/"
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1600"))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Stored format per decoded format; anything else is re-encoded as JPEG
+_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "png"}
+
+# Decoding and resizing are CPU-bound; a small dedicated pool keeps them off
+# the event loop without starving the default to_thread pool
+_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+
+class UploadTooLarge(Exception):
+    pass
+
+class InvalidImage(Exception):
+    pass
+
+def is_upload_url(url: str) -> bool:
+    """True for URLs returned by save_upload (and nothing outside UPLOAD_DIR)."""
+    name = url[len(UPLOAD_URL_PREFIX):] if url.startswith(UPLOAD_URL_PREFIX) else ""
+    return bool(name) and "/" not in name and ".." not in name
+
+async def _stream_to_disk(file: UploadFile, path: str) -> str:
+    """Copy the upload to `path` chunk by chunk; returns its sha256. Enforces UPLOAD_MAX_BYTES."""
+    digest, size = hashlib.sha256(), 0
+    async with aiofiles.open(path, "wb") as out:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                raise UploadTooLarge(f"Image exceeds the {UPLOAD_MAX_BYTES / (1024 * 1024):.1f} MB limit")
+            digest.update(chunk)
+            await out.write(chunk)
+    return digest.hexdigest()
+
+def _process(src: str, name: str) -> str:
+    """
+    Decode the raw upload, downscale it to IMAGE_MAX_DIMENSION and write it plus
+    a THUMBNAIL_SIZE JPEG thumbnail. Returns the stored file name. Runs in _pool.
+    """
+    try:
+        with Image.open(src) as img:
+            fmt = img.format
+            img = ImageOps.exif_transpose(img)  # phone photos are often stored rotated
+            ext = _FORMATS.get(fmt, "jpg")
+            if ext == "jpg" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+
+            stored = f"{name}.{ext}"
+            tmp = os.path.join(UPLOAD_DIR, f".{stored}.{uuid.uuid4().hex}")
+            img.save(tmp, format="JPEG" if ext == "jpg" else ext.upper(), optimize=True)
+
+            thumb = img.copy()
+            thumb.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            if thumb.mode not in ("RGB", "L"):
+                thumb = thumb.convert("RGB")
+            thumb_tmp = os.path.join(UPLOAD_DIR, "thumbs", f".{name}.{uuid.uuid4().hex}")
+            thumb.save(thumb_tmp, format="JPEG", quality=80)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e))
+
+    # Renames are atomic, so concurrent uploads of the same image can't leave a partial file
+    os.replace(thumb_tmp, os.path.join(UPLOAD_DIR, "thumbs", f"{name}.jpg"))
+    os.replace(tmp, os.path.join(UPLOAD_DIR, stored))
+    return stored
+
+def _find_existing(name: str):
+    for ext in set(_FORMATS.values()):
+        if os.path.exists(os.path.join(UPLOAD_DIR, f"{name}.{ext}")):
+            return f"{name}.{ext}"
+    return None
+
+async def save_upload(file: UploadFile) -> dict:
+    """
+    Store an uploaded image under a name derived from its content hash, so a
+    re-upload of the same bytes reuses the stored file. Returns
+    {"file_url", "thumbnail_url", "duplicate"}.
+    Raises UploadTooLarge or InvalidImage.
+    """
+    await aiofiles.os.makedirs(os.path.join(UPLOAD_DIR, "thumbs"), exist_ok=True)
+    raw = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}")
+    try:
+        digest = await _stream_to_disk(file, raw)
+        name = digest[:32]
+
+        loop = asyncio.get_running_loop()
+        stored = await loop.run_in_executor(_pool, _find_existing, name)
+        duplicate = stored is not None
+        if not duplicate:
+            stored = await loop.run_in_executor(_pool, _process, raw, name)
+    finally:
+        try:
+            await aiofiles.os.remove(raw)
+        except FileNotFoundError:
+            pass
+
+    if duplicate:
+        logger.info(f"Duplicate upload reused {stored}")
+    return {
+        "file_url": UPLOAD_URL_PREFIX + stored,
+        "thumbnail_url": f"{UPLOAD_URL_PREFIX}thumbs/{name}.jpg",
+        "duplicate": duplicate,
+    }
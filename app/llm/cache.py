@@ -0,0 +1,153 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Response cache settings (overridable via environment)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))             # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+# Shared backend for multi-worker deployments, e.g. redis://localhost:6379/0 (needs the redis package)
+LLM_CACHE_URL = os.getenv("LLM_CACHE_URL") or None
+
+_WS = re.compile(r"\s+")
+
+def cache_key(model: str, processed_messages: List[Dict[str, str]]) -> str:
+    """
+    Key for one completion request: the model and the full message list sent
+    (prompt, vehicle context, conversation summary and every turn), so two
+    requests share an answer only if the model would see the same input.
+    User text is whitespace-normalized and case-folded.
+    """
+    messages = [
+        [m["role"], _WS.sub(" ", m["content"]).strip().lower() if m["role"] == "user" else m["content"].strip()]
+        for m in processed_messages
+    ]
+    payload = json.dumps([model, messages], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class MemoryBackend:
+    """In-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class RedisBackend:
+    """Shared backend: Redis handles TTL; LRU via its maxmemory-policy (allkeys-lru)."""
+
+    prefix = "llm:resp:"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    async def clear(self):
+        async for key in self._client.scan_iter(match=self.prefix + "*"):
+            await self._client.delete(key)
+
+    def __len__(self) -> int:
+        return -1  # unknown without a round-trip
+
+class ResponseCache:
+    """
+    Cache of final model answers for deterministic (temperature 0) completions.
+    Backend errors are logged and treated as misses, never surfaced to the chat.
+    """
+
+    def __init__(self, backend=None, ttl: float = LLM_CACHE_TTL, enabled: bool = LLM_CACHE_ENABLED):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        backend = None
+        if LLM_CACHE_URL:
+            try:
+                backend = RedisBackend(LLM_CACHE_URL)
+                logger.info("LLM response cache using shared backend")
+            except ImportError:
+                logger.warning("LLM_CACHE_URL is set but the redis package is not installed; using in-process cache")
+        return cls(backend)
+
+    async def get(self, key: str, bypass: bool = False) -> Optional[str]:
+        if not self.enabled:
+            return None
+        if bypass:
+            self.bypassed += 1
+            return None
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"LLM cache read error: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        if not self.enabled or not value:
+            return
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"LLM cache write error: {e}")
+
+    async def clear(self):
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
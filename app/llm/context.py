@@ -0,0 +1,141 @@
+import os
+import logging
+from datetime import datetime, timezone
+from typing import List, Dict
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models import ChatSession, Message, SessionSummary
+from app.queries import recent_messages_query
+from app.db.archive import restore_session
+from app.session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+# Context window settings (overridable via environment)
+CONTEXT_RECENT_MESSAGES = int(os.getenv("CONTEXT_RECENT_MESSAGES", "8"))    # kept verbatim
+CONTEXT_COMPACT_BATCH = int(os.getenv("CONTEXT_COMPACT_BATCH", "6"))        # fold once this many spill over
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+class ConversationContext:
+    """
+    Builds the per-turn LLM context for a session: a stored rolling summary of
+    older turns plus the most recent messages verbatim, trimmed to a token budget.
+
+    Only rows past the summary are read (keyset on Message.id), every one of
+    them, so no turn falls between the summary and the verbatim window.
+    compact() keeps that tail under `recent` + `compact_batch` rows, so
+    per-turn cost stays flat however long the session gets.
+    """
+
+    def __init__(self, recent: int = CONTEXT_RECENT_MESSAGES,
+                 compact_batch: int = CONTEXT_COMPACT_BATCH,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.recent = recent
+        self.compact_batch = compact_batch
+        self.token_budget = token_budget
+
+    async def load(self, db: AsyncSession, session_id: str) -> List[Dict[str, str]]:
+        """
+        Return the history for the next LLM call, oldest first. An archived
+        session is restored first, in the caller's transaction; archived_at is
+        read here rather than trusted from the session cache, whose entry may
+        predate another worker's archival.
+        """
+        row = (await db.execute(
+            select(ChatSession.archived_at, SessionSummary)
+            .select_from(ChatSession)
+            .outerjoin(SessionSummary, SessionSummary.session_id == ChatSession.id)
+            .where(ChatSession.id == session_id)
+        )).first()
+        archived_at, summary = row if row else (None, None)
+        if archived_at is not None:
+            await restore_session(db, session_id)
+            session_cache.invalidate(session_id)
+
+        res = await db.execute(
+            recent_messages_query(session_id, after_id=summary.last_message_id if summary else 0)
+        )
+        recent = [{"role": role, "content": content} for role, content in res.all()]
+
+        # Drop the oldest verbatim turns until the window fits the budget
+        budget = self.token_budget - (estimate_tokens(summary.content) if summary else 0)
+        messages, used = [], 0
+        for msg in recent:
+            cost = estimate_tokens(msg["content"])
+            if messages and used + cost > budget:
+                break
+            messages.append(msg)
+            used += cost
+        messages.reverse()
+
+        if summary:
+            messages.insert(0, {
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {summary.content}",
+            })
+        return messages
+
+    async def compact(self, db: AsyncSession, session_id: str, llm) -> bool:
+        """
+        Fold turns that fell out of the verbatim window into the rolling summary.
+        Runs only once at least `compact_batch` messages have spilled over, so the
+        summarizer is called once every few turns. Returns True if it updated.
+        """
+        summary = await db.get(SessionSummary, session_id)
+        last_id = summary.last_message_id if summary else 0
+
+        pending = await db.scalar(
+            select(func.count()).select_from(Message)
+            .where(Message.session_id == session_id, Message.id > last_id, Message.role != "system")
+        )
+        spill = (pending or 0) - self.recent
+        if spill < self.compact_batch:
+            return False
+
+        res = await db.execute(
+            select(Message.id, Message.role, Message.content)
+            .where(Message.session_id == session_id, Message.id > last_id, Message.role != "system")
+            .order_by(Message.id)
+            .limit(spill)
+        )
+        rows = res.all()
+        if not rows:
+            return False
+
+        try:
+            content = await llm.summarize(
+                summary.content if summary else "",
+                [{"role": role, "content": text} for _, role, text in rows],
+            )
+        except Exception as e:
+            logger.error(f"Summarizing session {session_id} failed, keeping previous summary: {e}")
+            return False
+
+        # Upsert: a compaction racing this one (another worker, or an overlapping
+        # background task) may have written the row meanwhile. The summary that
+        # folded further wins; it never moves backwards.
+        stmt = pg_insert(SessionSummary).values(
+            session_id=session_id,
+            content=content,
+            last_message_id=rows[-1][0],
+            updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
+        )
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[SessionSummary.session_id],
+            set_={
+                "content": stmt.excluded.content,
+                "last_message_id": stmt.excluded.last_message_id,
+                "updated_at": stmt.excluded.updated_at,
+            },
+            where=SessionSummary.last_message_id < stmt.excluded.last_message_id,
+        ))
+        await db.commit()
+        logger.info(f"Compacted {len(rows)} messages into summary for session {session_id}")
+        return True
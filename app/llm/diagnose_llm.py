@@ -1,10 +1,14 @@
 import os
 import re
+import asyncio
 import logging
 import traceback
-from typing import List, Dict
-from groq import Groq
+from typing import List, Dict, AsyncIterator
+from groq import AsyncGroq
 from app.models import ChatSession
+from app.llm.cache import ResponseCache, cache_key
+from app.llm.semantic_cache import SemanticCache
+from app.llm.known_issues import KnownIssues, KNOWN_ISSUES_DIRECT
 
 # Configure logging
 logging.basicConfig(
@@ -17,18 +21,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# LLM call settings (overridable via environment)
+LLM_MODEL = os.getenv("LLM_MODEL", "gemma2-9b-it")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+# Point at a local stub server for load testing, e.g. http://127.0.0.1:9000
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
 class DiagnoseLLM:
-    def __init__(self):
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT,
+                 cache: ResponseCache = None, semantic_cache: SemanticCache = None, known_issues: KnownIssues = None):
         """
-        Initialize the DiagnoseLLM class and Groq client.
+        Initialize the DiagnoseLLM class and async Groq client.
+
+        At most `max_concurrency` completions are in flight at once; further
+        calls wait in line for a free slot. `timeout` bounds each model call.
+        Diagnosis answers are cached in `cache` (see app/llm/cache.py), and
+        first-turn answers also in `semantic_cache` for reworded repeats
+        (see app/llm/semantic_cache.py). Known issues for the session's vehicle
+        (data/car_issues_db.json) are added to the context, and clear symptom
+        matches are answered from them directly.
         """
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.cache = cache or ResponseCache.from_env()
+        self.semantic_cache = semantic_cache or SemanticCache()
+        self.known_issues = known_issues or KnownIssues.from_file()
         try:
             groq_api_key = os.environ.get("GROQ_API_KEY")
             if not groq_api_key:
                 logger.warning("GROQ_API_KEY not found in environment variables")
             
-            self.client = Groq(api_key=groq_api_key)
-            logger.info("Groq client initialized successfully")
+            self.client = AsyncGroq(api_key=groq_api_key, base_url=GROQ_BASE_URL, timeout=timeout)
+            logger.info(f"Groq async client initialized (max_concurrency={max_concurrency}, timeout={timeout}s)")
             
             # System prompt with strict automotive focus
             self.system_prompt = (
@@ -84,81 +110,171 @@ class DiagnoseLLM:
         else:
             return ""
 
-    async def get_diagnosis(self, messages: List[Dict[str, str]], session: ChatSession) -> str:
+    async def _create_completion(self, processed_messages: List[Dict[str, str]], max_tokens: int = 1024, **kwargs):
+        """
+        Run one chat completion under the concurrency limit.
+        Waits for a free slot (up to LLM_QUEUE_TIMEOUT), then calls the model with a per-call timeout.
+        """
+        await asyncio.wait_for(self._semaphore.acquire(), timeout=LLM_QUEUE_TIMEOUT)
+        try:
+            return await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=processed_messages,
+                    temperature=0.0,
+                    max_tokens=max_tokens,
+                    top_p=0.9,
+                    **kwargs
+                ),
+                timeout=self.timeout,
+            )
+        finally:
+            self._semaphore.release()
+
+    def _canned_response(self, user_messages: List[Dict[str, str]]) -> str:
+        """
+        Fixed replies for creator / friends questions. Returns "" when the model should answer.
+        """
+        # Check for creator mention
+        if user_messages and self._check_zia_mention(user_messages[-1]["content"]):
+            return (
+                "I am AutoGenius, an expert automotive diagnostic assistant built by Zia Ul Din, a data analyst and AI developer currently pursuing a BS in Business Analytics at International Islamic University Islamabad. Zia specializes in data analytics, machine learning, NLP, and AI-driven solutions, with hands-on experience developing predictive models, interactive dashboards, and chatbots using Python, SQL, Power BI, Flask, Gradio, and LLMs. His notable projects include AI Auto Workshop (AI-powered vehicle diagnostics and repair cost estimation), geospatial market analysis, and AI voice chatbot applications. How can I help with your vehicle today?"
+            )
+
+        # Check for friends mention
+        friend_mentioned = self._check_friends_mention(user_messages[-1]["content"]) if user_messages else ""
+        if friend_mentioned == "fuzail":
+            return (
+                "Fuzail Ahmed is a close friend of Zia Ul Din. "
+                "He is loyal, honest, and always stands by Zia in every situation. "
+                "Together, they have shared countless moments of trust, laughter, and mutual support through life's ups and downs."
+            )
+        elif friend_mentioned == "mansoor":
+            return (
+                "Mansoor Ahmed is a trusted friend of Zia Ul Din. "
+                "He is patient, kind-hearted, and always offers wise advice. "
+                "Over the years, he has stood by Zia during tough times, offering encouragement and helping him stay strong."
+            )
+        elif friend_mentioned == "chaudhary":
+            return (
+                "Chaudhary Ahtasham is a true friend of Zia Ul Din. "
+                "He is courageous, generous, and always ready to lend a helping hand. "
+                "He has supported Zia in achieving his goals and has been a source of motivation and strength."
+            )
+        return ""
+
+    def _is_vehicle_query(self, user_messages: List[Dict[str, str]]) -> bool:
+        """
+        Check if user is asking about their vehicle.
+        """
+        user_query = user_messages[-1]["content"].lower() if user_messages else ""
+        return any(q in user_query for q in [
+            "what car", "which vehicle", "my car", "what vehicle", 
+            "what am i driving", "what's my car"
+        ])
+
+    def _build_messages(self, messages: List[Dict[str, str]], session: ChatSession) -> List[Dict[str, str]]:
+        """
+        Prepend the system prompt and vehicle context to the conversation history.
+        """
+        # Create vehicle context
+        vehicle_info = f"{session.year} {session.manufacturer} {session.model}"
+        vehicle_context = (
+            f"Current Vehicle: {vehicle_info}\n"
+            f"All responses must be specific to this vehicle unless otherwise noted."
+        )
+
+        # Prepare messages for LLM
+        processed_messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "system", "content": vehicle_context}
+        ]
+        known_issues = self.known_issues.context(session.manufacturer, session.model, session.year)
+        if known_issues:
+            processed_messages.append({"role": "system", "content": known_issues})
+        
+        # Add conversation history (excluding previous system messages)
+        processed_messages.extend(
+            msg for msg in messages 
+            if msg["role"] not in ["system", "assistant"] or "Current Vehicle:" not in msg["content"]
+        )
+        return processed_messages
+
+    def _known_issue_answer(self, messages: List[Dict[str, str]], session: ChatSession) -> str:
+        """
+        Reply built from car_issues_db.json when the opening question clearly
+        describes one of the vehicle's known issues, else "". Later turns
+        depend on the conversation so far and always go to the model.
+        """
+        question = self._first_turn_question(messages)
+        if not KNOWN_ISSUES_DIRECT or not question:
+            return ""
+        issue = self.known_issues.best_match(question, session.manufacturer, session.model, session.year)
+        if issue is None:
+            return ""
+        logger.info(f"Answered from known issues: {issue.name}")
+        return self.known_issues.answer(issue, f"{session.year} {session.manufacturer} {session.model}")
+
+    def _first_turn_question(self, messages: List[Dict[str, str]]) -> str:
+        """
+        The user's question when it opens the conversation (no earlier user
+        turns, no summary), else "". Only such questions are semantically cached.
+        """
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+        if len(user_messages) != 1 or any(msg["role"] == "system" for msg in messages):
+            return ""
+        return user_messages[0]["content"]
+
+    async def _cached_answer(self, key: str, vehicle: str, question: str, bypass: bool):
+        """Exact-match cache first, then (first turns only) the near-duplicate cache."""
+        response = await self.cache.get(key, bypass=bypass)
+        if response is None and question:
+            match = await asyncio.to_thread(self.semantic_cache.lookup, vehicle, question, bypass)
+            if match:
+                response, matched, similarity = match
+                logger.info(f"Semantic cache hit ({similarity:.2f}): {question[:50]!r} ~ {matched[:50]!r}")
+        return response
+
+    async def _remember(self, key: str, vehicle: str, question: str, response: str):
+        await self.cache.set(key, response)
+        if question:
+            await asyncio.to_thread(self.semantic_cache.add, vehicle, question, response)
+
+    async def get_diagnosis(self, messages: List[Dict[str, str]], session: ChatSession, bypass_cache: bool = False) -> str:
         """
         Generate diagnosis with strict vehicle context.
+        With bypass_cache, the model is always called (and its answer re-cached).
         """
         try:
             if not self.client:
                 return "I'm having technical difficulties. Please try again later."
 
-            # Check for creator mention
             user_messages = [msg for msg in messages if msg["role"] == "user"]
-            if user_messages and self._check_zia_mention(user_messages[-1]["content"]):
-                return (
-                    "I am AutoGenius, an expert automotive diagnostic assistant built by Zia Ul Din, a data analyst and AI developer currently pursuing a BS in Business Analytics at International Islamic University Islamabad. Zia specializes in data analytics, machine learning, NLP, and AI-driven solutions, with hands-on experience developing predictive models, interactive dashboards, and chatbots using Python, SQL, Power BI, Flask, Gradio, and LLMs. His notable projects include AI Auto Workshop (AI-powered vehicle diagnostics and repair cost estimation), geospatial market analysis, and AI voice chatbot applications. How can I help with your vehicle today?"
-                )
+            canned = self._canned_response(user_messages)
+            if canned:
+                return canned
 
-            # Check for friends mention
-            friend_mentioned = self._check_friends_mention(user_messages[-1]["content"]) if user_messages else ""
-            if friend_mentioned == "fuzail":
-                return (
-                    "Fuzail Ahmed is a close friend of Zia Ul Din. "
-                    "He is loyal, honest, and always stands by Zia in every situation. "
-                    "Together, they have shared countless moments of trust, laughter, and mutual support through life's ups and downs."
-                )
-            elif friend_mentioned == "mansoor":
-                return (
-                    "Mansoor Ahmed is a trusted friend of Zia Ul Din. "
-                    "He is patient, kind-hearted, and always offers wise advice. "
-                    "Over the years, he has stood by Zia during tough times, offering encouragement and helping him stay strong."
-                )
-            elif friend_mentioned == "chaudhary":
-                return (
-                    "Chaudhary Ahtasham is a true friend of Zia Ul Din. "
-                    "He is courageous, generous, and always ready to lend a helping hand. "
-                    "He has supported Zia in achieving his goals and has been a source of motivation and strength."
-                )
-
-            # Create vehicle context
             vehicle_info = f"{session.year} {session.manufacturer} {session.model}"
-            vehicle_context = (
-                f"Current Vehicle: {vehicle_info}\n"
-                f"All responses must be specific to this vehicle unless otherwise noted."
-            )
+            is_vehicle_query = self._is_vehicle_query(user_messages)
+            if not is_vehicle_query:
+                known = self._known_issue_answer(messages, session)
+                if known:
+                    return known
+            processed_messages = self._build_messages(messages, session)
 
-            # Check if user is asking about their vehicle
-            user_query = user_messages[-1]["content"].lower() if user_messages else ""
-            is_vehicle_query = any(q in user_query for q in [
-                "what car", "which vehicle", "my car", "what vehicle", 
-                "what am i driving", "what's my car"
-            ])
-
-            # Prepare messages for LLM
-            processed_messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "system", "content": vehicle_context}
-            ]
-            
-            # Add conversation history (excluding previous system messages)
-            processed_messages.extend(
-                msg for msg in messages 
-                if msg["role"] not in ["system", "assistant"] or "Current Vehicle:" not in msg["content"]
-            )
+            key = cache_key(LLM_MODEL, processed_messages)
+            vehicle = SemanticCache.vehicle_key(session)
+            question = self._first_turn_question(messages)
+            response = await self._cached_answer(key, vehicle, question, bypass_cache)
+            if response is None:
+                # Generate response
+                chat_completion = await self._create_completion(processed_messages)
 
-            # Generate response
-            chat_completion = self.client.chat.completions.create(
-                model="gemma2-9b-it",
-                messages=processed_messages,
-                temperature=0.0,
-                max_tokens=1024,
-                top_p=0.9
-            )
-            
-            response = chat_completion.choices[0].message.content
+                response = chat_completion.choices[0].message.content
 
-            # Remove any special formatting (like **)
-            response = re.sub(r'\*\*', '', response)
+                # Remove any special formatting (like **)
+                response = re.sub(r'\*\*', '', response)
+                await self._remember(key, vehicle, question, response)
 
             # Force vehicle info for vehicle queries
             if is_vehicle_query:
@@ -170,6 +286,100 @@ class DiagnoseLLM:
             
             return response
         
+        except asyncio.TimeoutError:
+            logger.error("LLM call timed out or waited too long for a free slot")
+            return "The diagnostic service is busy right now. Please try again in a moment."
         except Exception as e:
             logger.error(f"Error in get_diagnosis: {str(e)}")
             return "I encountered a technical error. Please describe your vehicle issue."
+
+    async def summarize(self, previous_summary: str, messages: List[Dict[str, str]]) -> str:
+        """
+        Fold older conversation turns into a short rolling summary.
+        Raises on failure so the caller can keep the previous summary.
+        """
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (
+            "Summarize this vehicle diagnostic conversation in at most 120 words. "
+            "Keep symptoms, error codes, checks already done and advice already given. "
+            "Plain text only.\n\n"
+            f"Previous summary:\n{previous_summary or '(none)'}\n\n"
+            f"New turns:\n{transcript}"
+        )
+        completion = await self._create_completion([{"role": "user", "content": prompt}], max_tokens=256)
+        return re.sub(r'\*\*', '', completion.choices[0].message.content).strip()
+
+    async def stream_diagnosis(self, messages: List[Dict[str, str]], session: ChatSession, bypass_cache: bool = False) -> AsyncIterator[str]:
+        """
+        Same as get_diagnosis, but yields the response text piece by piece as the model produces it.
+        Canned, vehicle-info and cached replies are yielded as a single chunk without calling the model.
+        """
+        if not self.client:
+            yield "I'm having technical difficulties. Please try again later."
+            return
+
+        user_messages = [msg for msg in messages if msg["role"] == "user"]
+        canned = self._canned_response(user_messages)
+        if canned:
+            yield canned
+            return
+
+        if self._is_vehicle_query(user_messages):
+            yield f"You have a {session.year} {session.manufacturer} {session.model}. How can I help with your vehicle today?"
+            return
+
+        known = self._known_issue_answer(messages, session)
+        if known:
+            yield known
+            return
+
+        processed_messages = self._build_messages(messages, session)
+        key = cache_key(LLM_MODEL, processed_messages)
+        vehicle = SemanticCache.vehicle_key(session)
+        question = self._first_turn_question(messages)
+        cached = await self._cached_answer(key, vehicle, question, bypass_cache)
+        if cached is not None:
+            yield cached
+            return
+
+        pending = ""
+        parts = []
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=LLM_QUEUE_TIMEOUT)
+            try:
+                stream = await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=processed_messages,
+                        temperature=0.0,
+                        max_tokens=1024,
+                        top_p=0.9,
+                        stream=True,
+                    ),
+                    timeout=self.timeout,
+                )
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    # Strip ** across chunk boundaries: hold back a trailing "*" until the next chunk
+                    text = re.sub(r'\*\*', '', pending + delta)
+                    pending = "*" if text.endswith("*") else ""
+                    text = text[:-1] if pending else text
+                    if text:
+                        parts.append(text)
+                        yield text
+            finally:
+                self._semaphore.release()
+            if pending:
+                parts.append(pending)
+                yield pending
+            # Only complete answers are cached
+            await self._remember(key, vehicle, question, "".join(parts))
+
+        except asyncio.TimeoutError:
+            logger.error("LLM stream timed out or waited too long for a free slot")
+            yield "The diagnostic service is busy right now. Please try again in a moment."
+        except Exception as e:
+            logger.error(f"Error in stream_diagnosis: {str(e)}")
+            yield "I encountered a technical error. Please describe your vehicle issue."
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import logging
+from bisect import bisect_right
+from datetime import datetime
+from typing import List, Dict, Optional
+
+from app.llm.semantic_cache import tokenize, negations
+
+logger = logging.getLogger(__name__)
+
+CAR_ISSUES_FILE = os.getenv("CAR_ISSUES_FILE", "data/car_issues_db.json")
+# Answer straight from the database when a question matches this many of one issue's symptoms
+KNOWN_ISSUES_DIRECT_MIN_MATCHES = int(os.getenv("KNOWN_ISSUES_DIRECT_MIN_MATCHES", "2"))
+KNOWN_ISSUES_DIRECT = os.getenv("KNOWN_ISSUES_DIRECT", "true").lower() in ("1", "true", "yes")
+# Share of a symptom phrase's terms that must appear in the question
+_PHRASE_MATCH_RATIO = 0.6
+# A clause with one of these states its symptom negatively ("AC not cooling")
+_NEGATION_CUES = {
+    "no", "not", "never", "without", "none", "nothing",
+    "wont", "cant", "dont", "doesnt", "didnt", "isnt", "wasnt", "arent", "werent", "havent", "hasnt",
+}
+# A clause with one of these reports no current symptom ("fixed the AC"), nor does a
+# negated one naming a problem ("no cooling problem")
+_RESOLVED_CUES = {"fixed", "repaired", "replaced", "resolved"}
+_PROBLEM_WORDS = {"problem", "problems", "issue", "issues", "trouble"}
+_CLAUSE = re.compile(r"[,.;:!?]+|\b(?:but|and|however|although|though)\b")
+_WORD = re.compile(r"[a-z]+")
+
+def symptom_terms(question: str) -> tuple:
+    """
+    (affirmed, negated) question terms, clause by clause: "AC compressor makes
+    a noise" is affirmed, "AC is not cooling" negated (without the negation
+    itself). Clauses dismissing a symptom count as neither.
+    """
+    affirmed, negated = set(), set()
+    for clause in _CLAUSE.split(question.lower()):
+        words = set(_WORD.findall(clause.replace("'", "")))
+        if words & _RESOLVED_CUES:
+            continue
+        if words & _NEGATION_CUES:
+            if not words & _PROBLEM_WORDS:
+                negated.update(set(tokenize(clause)) - negations(clause))
+        else:
+            affirmed.update(tokenize(clause))
+    return affirmed, negated
+
+def _parse_range(text: str) -> tuple:
+    """'2015-2020' -> (2015, 2020); '8+' -> (8, inf); '2019' -> (2019, 2019)."""
+    text = text.strip()
+    if text.endswith("+"):
+        return int(text[:-1]), float("inf")
+    low, _, high = text.partition("-")
+    return int(low), int(high or low)
+
+class _Intervals:
+    """Non-overlapping [low, high] ranges -> value, looked up by bisect."""
+
+    def __init__(self, ranges: Dict[str, list]):
+        spans = sorted((_parse_range(key), value) for key, value in ranges.items())
+        self.lows = [low for (low, _), _ in spans]
+        self.highs = [high for (_, high), _ in spans]
+        self.values = [value for _, value in spans]
+
+    def find(self, point: int):
+        i = bisect_right(self.lows, point) - 1
+        if i >= 0 and point <= self.highs[i]:
+            return self.values[i]
+        return None
+
+class _Issue:
+    def __init__(self, raw: dict, model_specific: bool):
+        self.name = raw["issue"]
+        self.symptoms = raw.get("symptoms", "")
+        self.parts = raw.get("parts_to_check", [])
+        self.severity = raw.get("severity", "")
+        self.model_specific = model_specific
+        # "Jerking, hesitation, or shuddering during acceleration" -> one term set per phrase;
+        # "no cooling" is kept as ({cool}, negated) so "AC not cooling" covers it
+        self.phrases = []
+        for phrase in [self.name] + self.symptoms.replace(" or ", ",").split(","):
+            negation = negations(phrase)
+            terms = set(tokenize(phrase)) - negation
+            if terms:
+                self.phrases.append((terms, bool(negation)))
+
+    def matches(self, affirmed: set, negated: set) -> int:
+        """Number of this issue's name/symptom phrases the question covers, with the same polarity."""
+        return sum(
+            1 for terms, is_negated in self.phrases
+            if len(terms & (negated if is_negated else affirmed)) / len(terms) >= _PHRASE_MATCH_RATIO
+        )
+
+    def summary(self) -> str:
+        return f"{self.name} ({self.severity}): {self.symptoms}; check {', '.join(self.parts)}"
+
+class KnownIssues:
+    """
+    data/car_issues_db.json, indexed for per-turn lookups: model-specific
+    issues by (manufacturer, model) then model-year range, plus age-based
+    issues by vehicle age. Both range lookups are a bisect.
+    """
+
+    def __init__(self, data: dict):
+        self._models = {}
+        for make, models in data.get("common_issues", {}).items():
+            for model, ranges in models.items():
+                self._models[(make.lower(), model.lower())] = _Intervals({
+                    years: [_Issue(raw, model_specific=True) for raw in issues]
+                    for years, issues in ranges.items()
+                })
+        self._ages = _Intervals({
+            ages: [_Issue(raw, model_specific=False) for raw in issues]
+            for ages, issues in data.get("age_based_issues", {}).items()
+        })
+        self.direct_answers = 0
+
+    @classmethod
+    def from_file(cls, path: str = CAR_ISSUES_FILE) -> "KnownIssues":
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Known-issues database not loaded ({e}); continuing without it")
+            data = {}
+        index = cls(data)
+        logger.info(f"Loaded known issues for {len(index._models)} models from {path}")
+        return index
+
+    def for_vehicle(self, manufacturer: str, model: str, year: int) -> list:
+        """Model-specific issues for this model year, then age-based ones."""
+        issues = []
+        ranges = self._models.get((manufacturer.strip().lower(), model.strip().lower()))
+        if ranges:
+            issues.extend(ranges.find(year) or [])
+        issues.extend(self._ages.find(max(0, datetime.now().year - year)) or [])
+        return issues
+
+    def context(self, manufacturer: str, model: str, year: int) -> str:
+        """Compact system-prompt note listing the vehicle's known issues, or ""."""
+        issues = self.for_vehicle(manufacturer, model, year)
+        if not issues:
+            return ""
+        lines = "\n".join(f"{i}. {issue.summary()}" for i, issue in enumerate(issues, 1))
+        return f"Known issues for this vehicle, from workshop records (mention them only when relevant):\n{lines}"
+
+    def best_match(self, question: str, manufacturer: str, model: str, year: int) -> Optional[_Issue]:
+        """
+        The model-specific issue the question describes with high confidence:
+        at least KNOWN_ISSUES_DIRECT_MIN_MATCHES phrases matched, and no other
+        issue matching as well. Age-based issues are too generic to answer from.
+        Phrases only count when stated with the same polarity (symptom_terms).
+        """
+        affirmed, negated = symptom_terms(question)
+        if not affirmed and not negated:
+            return None
+        scored = sorted(
+            ((issue.matches(affirmed, negated), issue) for issue in self.for_vehicle(manufacturer, model, year) if issue.model_specific),
+            key=lambda pair: pair[0], reverse=True,
+        )
+        if not scored or scored[0][0] < KNOWN_ISSUES_DIRECT_MIN_MATCHES:
+            return None
+        if len(scored) > 1 and scored[1][0] == scored[0][0]:
+            return None
+        return scored[0][1]
+
+    def answer(self, issue: _Issue, vehicle_info: str) -> str:
+        self.direct_answers += 1
+        parts = "\n".join(f"{i}. {part}" for i, part in enumerate(issue.parts, 1))
+        return (
+            f"These symptoms match a known issue on the {vehicle_info}: {issue.name} (severity: {issue.severity}).\n"
+            f"Typical signs: {issue.symptoms}.\n"
+            f"Parts to check:\n{parts}\n"
+            "If the checks don't reveal the cause, describe what you found and I can help narrow it down."
+        )
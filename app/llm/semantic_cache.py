@@ -0,0 +1,191 @@
+import os
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict, Counter
+from typing import Optional
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer, ENGLISH_STOP_WORDS
+
+logger = logging.getLogger(__name__)
+
+# Semantic cache settings (overridable via environment)
+LLM_SEMANTIC_CACHE_ENABLED = os.getenv("LLM_SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_SEMANTIC_THRESHOLD = float(os.getenv("LLM_SEMANTIC_THRESHOLD", "0.88"))      # cosine similarity
+LLM_SEMANTIC_MAX_PER_VEHICLE = int(os.getenv("LLM_SEMANTIC_MAX_PER_VEHICLE", "500"))
+LLM_SEMANTIC_TTL = float(os.getenv("LLM_SEMANTIC_TTL", "604800"))                 # seconds
+
+# Negations flip a complaint's meaning, so they are kept as terms
+_NEGATIONS = {"no", "not", "never", "cannot", "nothing", "none"}
+_STOP_WORDS = frozenset(ENGLISH_STOP_WORDS - _NEGATIONS)
+_CONTRACTIONS = re.compile(r"\b(won'?t|can'?t|don'?t|doesn'?t|didn'?t|isn'?t|wasn'?t|aren'?t|wouldn'?t)\b")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def _stem(token: str) -> str:
+    # Light suffix stripping so "starting"/"starts"/"started" match "start"
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            token = token[:-len(suffix)]
+            # "stopping" -> "stopp" -> "stop"
+            if suffix in ("ing", "ed") and token[-1] == token[-2] and token[-1] not in "aeiousl":
+                token = token[:-1]
+            return token
+    return token
+
+def tokenize(text: str) -> list[str]:
+    text = _CONTRACTIONS.sub(" not ", text.lower())
+    return [_stem(t) for t in _TOKEN.findall(text) if t not in _STOP_WORDS]
+
+def negations(text: str) -> frozenset:
+    """The negation terms of a question; two questions only match if theirs are equal."""
+    return frozenset(t for t in tokenize(text) if t in _NEGATIONS)
+
+class _VehicleEntries:
+    """Past questions and answers for one vehicle, with a lazily refitted TF-IDF matrix."""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # normalized question -> (expires_at, answer)
+        self.questions = []
+        self.negations = []
+        self.vectorizer = None
+        self.matrix = None
+
+    def refit(self):
+        self.questions = list(self.entries)
+        self.negations = [negations(q) for q in self.questions]
+        self.vectorizer = TfidfVectorizer(tokenizer=tokenize, token_pattern=None, lowercase=False, sublinear_tf=True)
+        try:
+            self.matrix = self.vectorizer.fit_transform(self.questions)
+        except ValueError:  # only stop words
+            self.vectorizer, self.matrix = None, None
+            return
+        # Weight a term the fitted vocabulary has never seen like its rarest term
+        self.unseen_idf = float(self.vectorizer.idf_.max())
+
+    def similarities(self, question: str):
+        """
+        Cosine of `question` against every stored question. Unlike a plain
+        transform, terms outside the vocabulary still count towards the
+        question's norm, so extra details ("starts fine but ...") lower the score.
+        """
+        vocab, idf = self.vectorizer.vocabulary_, self.vectorizer.idf_
+        terms = Counter(tokenize(question))
+        if not terms:
+            return None
+        cols, weights, norm = [], [], 0.0
+        for term, count in terms.items():
+            col = vocab.get(term)
+            weight = (1 + np.log(count)) * (idf[col] if col is not None else self.unseen_idf)
+            norm += weight * weight
+            if col is not None:
+                cols.append(col)
+                weights.append(weight)
+        if not cols:
+            return np.zeros(self.matrix.shape[0])
+        return (self.matrix[:, cols] @ np.asarray(weights)) / np.sqrt(norm)
+
+class SemanticCache:
+    """
+    Near-duplicate question cache: serves a stored diagnosis when a new
+    question for the same vehicle has TF-IDF cosine similarity >= `threshold`
+    with one asked before ("car wont start clicking" ~ "clicking noise car not
+    starting") and the same negations, so "car starts clicking" never gets the
+    answer for "car wont start clicking". Only meant for first turns, where the
+    question is the whole context. Entries are LRU-evicted per vehicle and
+    expire after `ttl`.
+
+    Lookups are CPU work (scoring the vehicle's stored questions, plus a
+    refit of those few hundred after inserts); call them from a worker thread.
+    """
+
+    def __init__(self, threshold: float = LLM_SEMANTIC_THRESHOLD,
+                 max_per_vehicle: int = LLM_SEMANTIC_MAX_PER_VEHICLE,
+                 ttl: float = LLM_SEMANTIC_TTL,
+                 enabled: bool = LLM_SEMANTIC_CACHE_ENABLED):
+        self.threshold = threshold
+        self.max_per_vehicle = max_per_vehicle
+        self.ttl = ttl
+        self.enabled = enabled
+        self._vehicles = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def vehicle_key(session) -> str:
+        return f"{session.year} {session.manufacturer} {session.model}".lower()
+
+    def lookup(self, vehicle: str, question: str, bypass: bool = False) -> Optional[tuple]:
+        """(answer, matched question, similarity) for the closest past question, or None below the threshold."""
+        if not self.enabled:
+            return None
+        if bypass:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        with self._lock:
+            match = self._match(vehicle, question)
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return match
+
+    def _match(self, vehicle: str, question: str):
+        bucket = self._vehicles.get(vehicle)
+        if bucket is None or not bucket.entries:
+            return None
+        if bucket.matrix is None or len(bucket.questions) != len(bucket.entries):
+            bucket.refit()
+            if bucket.matrix is None:
+                return None
+
+        sims = bucket.similarities(question)
+        if sims is None:
+            return None
+        # Opposite meanings share nearly every term; only same-polarity questions may match
+        wanted = negations(question)
+        same_polarity = np.array([n == wanted for n in bucket.negations])
+        sims = np.where(same_polarity, sims, -1.0)
+        best = int(np.argmax(sims))
+        if not same_polarity[best] or sims[best] < self.threshold:
+            return None
+        matched = bucket.questions[best]
+        expires_at, answer = bucket.entries[matched]
+        if expires_at < time.monotonic():
+            del bucket.entries[matched]
+            return None
+        bucket.entries.move_to_end(matched)
+        return answer, matched, float(sims[best])
+
+    def add(self, vehicle: str, question: str, answer: str):
+        if not self.enabled or not answer or not tokenize(question):
+            return
+        key = " ".join(question.split()).lower()
+        with self._lock:
+            bucket = self._vehicles.setdefault(vehicle, _VehicleEntries())
+            bucket.entries[key] = (time.monotonic() + self.ttl, answer)
+            bucket.entries.move_to_end(key)
+            while len(bucket.entries) > self.max_per_vehicle:
+                bucket.entries.popitem(last=False)
+            bucket.matrix = None  # refit on the next lookup
+
+    def clear(self):
+        with self._lock:
+            self._vehicles.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "vehicles": len(self._vehicles),
+                "entries": sum(len(b.entries) for b in self._vehicles.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
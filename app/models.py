@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, SmallInteger, BigInteger, Float, Text, DateTime, ForeignKey, ForeignKeyConstraint, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -13,6 +13,16 @@ class Product(Base):
     manufacturer = Column(String, nullable=True)
     price        = Column(Integer,  nullable=False)
     url          = Column(String, nullable=True)
+    natural_key  = Column(String, nullable=False, unique=True)  # url, else title|manufacturer; see app/db/catalog.py
+    row_hash     = Column(String(32), nullable=True)  # md5 of the content columns, see app.db.catalog.ROW_HASH
+
+class CatalogChange(Base):
+    __tablename__ = "catalog_changes"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    product_id = Column(String, nullable=False)  # No FK: deleted products are logged too
+    op = Column(String(1), nullable=False)  # "I"nsert, "U"pdate or "D"elete
+    changed_at = Column(DateTime(timezone=True), nullable=False)
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
@@ -24,6 +34,8 @@ class ChatSession(Base):
     year = Column(Integer, nullable=False)
     created_at = Column(DateTime(timezone=True))
     text_size = Column(String, default="xxlarge")
+    archived_at = Column(DateTime(timezone=True), nullable=True)  # Messages moved to session_archives, see app/db/archive.py
+    restored_at = Column(DateTime(timezone=True), nullable=True)  # Last restore; counts as activity for archival
     
     # Relationship to Message
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan", order_by="Message.timestamp")
@@ -35,9 +47,57 @@ class Message(Base):
     session_id = Column(String, ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False)
     role = Column(String, nullable=False)  # "user" or "assistant"
     content = Column(Text, nullable=False)
-    timestamp = Column(DateTime(timezone=True))
+    timestamp = Column(DateTime(timezone=True), nullable=False)  # Partition key: messages is partitioned by month
     car_image = Column(String, nullable=True)
-    products = Column(Text, nullable=True)  # JSON string of product recommendations
     
     # Relationship to ChatSession
-    session = relationship("ChatSession", back_populates="messages")
\ No newline at end of file
+    session = relationship("ChatSession", back_populates="messages")
+    # Recommended products, best first; inserted in the same flush as the message
+    recommendations = relationship("MessageProduct", back_populates="message", cascade="all, delete-orphan",
+                                   passive_deletes=True, order_by="MessageProduct.rank")
+
+class MessageProduct(Base):
+    __tablename__ = "message_products"
+    # messages is partitioned on timestamp, so its key (and this FK) includes it
+    __table_args__ = (
+        ForeignKeyConstraint(["message_id", "message_timestamp"], ["messages.id", "messages.timestamp"], ondelete="CASCADE"),
+    )
+    
+    message_id = Column(Integer, primary_key=True)
+    message_timestamp = Column(DateTime(timezone=True), nullable=False)
+    rank = Column(SmallInteger, primary_key=True)  # 1 = best
+    product_id = Column(String, nullable=False)  # No FK: products deleted by a catalog sync stay in history
+    score = Column(Float, nullable=True)  # Cosine similarity from the recommender
+    
+    message = relationship("Message", back_populates="recommendations")
+
+class SessionSummary(Base):
+    __tablename__ = "session_summaries"
+    
+    session_id = Column(String, ForeignKey("chat_sessions.id", ondelete="CASCADE"), primary_key=True)
+    content = Column(Text, nullable=False)  # Rolling summary of turns older than the verbatim window
+    last_message_id = Column(Integer, nullable=False)  # Newest Message.id folded into the summary
+    updated_at = Column(DateTime(timezone=True))
+
+class SessionArchive(Base):
+    __tablename__ = "session_archives"
+    
+    session_id = Column(String, ForeignKey("chat_sessions.id", ondelete="CASCADE"), primary_key=True)
+    message_count = Column(Integer, nullable=False)
+    last_message = Column(String, nullable=True)  # History-list last message while the messages are archived
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed JSON list of the session's messages
+    archived_at = Column(DateTime(timezone=True), nullable=False)
+
+class PurgeJob(Base):
+    __tablename__ = "purge_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, nullable=True)  # None = every user's history
+    status = Column(String, nullable=False, default="pending")  # pending, running, done or failed
+    method = Column(String, nullable=True)  # "truncate" or "batched"
+    sessions_deleted = Column(Integer, nullable=False, default=0)
+    messages_deleted = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)  # Only sessions created up to here are purged
+    updated_at = Column(DateTime(timezone=True), nullable=False)  # Heartbeat while running
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,115 @@
+from typing import Optional
+from datetime import datetime, timezone
+from sqlalchemy import desc, func, true, and_, tuple_, literal_column
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased, load_only
+
+from app.models import ChatSession, Message, MessageProduct, Product, SessionArchive
+
+# Sessions without a created_at sort (and page) as if created at this instant,
+# i.e. last in the newest-first history list. _created_at is the expression
+# indexed by ix_chat_sessions_created_at_coalesced (app/db/migrations.py)
+NULL_CREATED_AT = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_created_at = func.coalesce(
+    ChatSession.created_at, literal_column(f"'{NULL_CREATED_AT.isoformat()}'::timestamptz")
+)
+
+def history_page_query(limit: int, after: Optional[tuple] = None):
+    """
+    One page of sessions, newest first, each with its last message and
+    message count. `after` is the (created_at, id) of the previous page's last row,
+    with NULL_CREATED_AT standing in for a missing created_at.
+    Archived sessions (see app/db/archive.py) report their archive's last message and count.
+    """
+    last_msg = (
+        # Newest entry of ix_messages_session_ts, then one heap fetch for its content
+        select(Message.content)
+        .where(Message.session_id == ChatSession.id)
+        .order_by(desc(Message.timestamp), desc(Message.id))
+        .limit(1)
+        .lateral("last_msg")
+    )
+    msg_count = (
+        select(func.count().label("n"))
+        .where(Message.session_id == ChatSession.id)
+        .lateral("msg_count")
+    )
+    query = (
+        select(
+            ChatSession,
+            func.coalesce(last_msg.c.content, SessionArchive.last_message),
+            func.coalesce(SessionArchive.message_count, 0) + msg_count.c.n,
+        )
+        .select_from(ChatSession)
+        .outerjoin(last_msg, true())
+        .outerjoin(msg_count, true())
+        .outerjoin(SessionArchive, SessionArchive.session_id == ChatSession.id)
+        .order_by(desc(_created_at), desc(ChatSession.id))
+        .limit(limit)
+    )
+    if after:
+        query = query.where(tuple_(_created_at, ChatSession.id) < tuple_(*after))
+    return query
+
+def transcript_query(session_id: str, after: Optional[tuple] = None, limit: Optional[int] = None):
+    """
+    A session's messages in (timestamp, id) order, optionally after a (timestamp, id)
+    position, hydrated with their recommended products in the same query: one
+    (Message, score, Product) row per recommendation, best first, or
+    (Message, None, None) for a message without any. `limit` counts messages.
+    """
+    page = select(Message).where(Message.session_id == session_id).order_by(Message.timestamp, Message.id)
+    if after:
+        page = page.where(tuple_(Message.timestamp, Message.id) > tuple_(*after))
+    if limit:
+        page = page.limit(limit)
+    msg = aliased(Message, page.subquery("page"))
+    return (
+        select(msg, MessageProduct.score, Product)
+        .outerjoin(MessageProduct, and_(
+            MessageProduct.message_id == msg.id, MessageProduct.message_timestamp == msg.timestamp
+        ))
+        # Products since deleted from the catalog drop out of old transcripts
+        .outerjoin(Product, Product.id == MessageProduct.product_id)
+        .order_by(msg.timestamp, msg.id, MessageProduct.rank)
+        .options(load_only(Product.id, Product.title, Product.manufacturer, Product.price, Product.url))
+    )
+
+def recent_messages_query(session_id: str, limit: Optional[int] = None, after_id: int = 0):
+    """A session's non-system messages after `after_id`, newest first; the newest `limit` if given."""
+    query = select(Message.role, Message.content).where(
+        Message.session_id == session_id, Message.role != "system"
+    )
+    if after_id:
+        query = query.where(Message.id > after_id)
+    query = query.order_by(Message.timestamp.desc(), Message.id.desc())
+    if limit:
+        query = query.limit(limit)
+    return query
+
+def top_products_query(since: datetime, limit: int = 20):
+    """Products recommended most often since `since`: (Product, times recommended)."""
+    counts = (
+        select(MessageProduct.product_id, func.count().label("n"))
+        .where(MessageProduct.message_timestamp >= since)
+        .group_by(MessageProduct.product_id)
+        .order_by(desc("n"))
+        .limit(limit)
+        .subquery("counts")
+    )
+    return (
+        select(Product, counts.c.n)
+        .join(counts, counts.c.product_id == Product.id)
+        .order_by(desc(counts.c.n), Product.id)
+    )
+
+# Used by scripts/check_query_plans.py to spot-check index usage
+def sample_queries(session_id: str = "sample", created_at: datetime = None):
+    created_at = created_at or datetime(2100, 1, 1)
+    return {
+        "history page": history_page_query(50, after=(created_at, "zzzz")),
+        "transcript": transcript_query(session_id),
+        "transcript after cursor": transcript_query(session_id, after=(created_at, 0), limit=100),
+        "chat context": recent_messages_query(session_id, 8),
+        "top products": top_products_query(created_at),
+    }
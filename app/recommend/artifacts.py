@@ -0,0 +1,191 @@
+import os
+import json
+import shutil
+import logging
+from datetime import datetime
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+logger = logging.getLogger(__name__)
+
+# Where prebuilt index versions live; CURRENT names the one workers load
+INDEX_ARTIFACT_DIR = os.getenv("INDEX_ARTIFACT_DIR", "data/index")
+KEEP_VERSIONS = 3
+
+# Product columns kept for building results (the text columns are only needed to fit)
+RESULT_COLUMNS = ["id", "title", "manufacturer", "url"]
+
+def _versions(base_dir: str) -> list:
+    """Version numbers of the v<N> directories under base_dir, ascending."""
+    if not os.path.isdir(base_dir):
+        return []
+    return sorted(int(d[1:]) for d in os.listdir(base_dir) if d.startswith("v") and d[1:].isdigit())
+
+def _current_name(base_dir: str):
+    try:
+        with open(os.path.join(base_dir, "CURRENT")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def claim_version(at_least: int = 1, base_dir: str = INDEX_ARTIFACT_DIR) -> int:
+    """
+    Reserve the next free version for a build that will be saved: above every
+    v<N> on disk (and `at_least`). mkdir is atomic, so two builders never
+    claim the same number.
+    """
+    os.makedirs(base_dir, exist_ok=True)
+    current = _current_name(base_dir)
+    version = max([at_least - 1, *_versions(base_dir),
+                   int(current[1:]) if current and current[1:].isdigit() else 0]) + 1
+    while True:
+        try:
+            os.mkdir(os.path.join(base_dir, f"v{version}"))
+            return version
+        except FileExistsError:
+            version += 1
+
+def release_version(version: int, base_dir: str = INDEX_ARTIFACT_DIR):
+    """Give back a claimed version whose build was never saved."""
+    try:
+        os.rmdir(os.path.join(base_dir, f"v{version}"))
+    except OSError:
+        pass  # already saved, or gone
+
+def _save_csr(path: str, prefix: str, matrix) -> list:
+    """Write a CSR matrix as <prefix>data.npy / indices.npy / indptr.npy; returns its shape."""
+    matrix = csr_matrix(matrix)
+    matrix.sort_indices()
+    np.save(os.path.join(path, f"{prefix}data.npy"), matrix.data.astype(np.float32))
+    # int32 indices unless nnz needs more, matching what scipy would pick (so loading doesn't copy)
+    index_dtype = np.int32 if matrix.nnz < 2**31 else np.int64
+    np.save(os.path.join(path, f"{prefix}indices.npy"), matrix.indices.astype(index_dtype))
+    np.save(os.path.join(path, f"{prefix}indptr.npy"), matrix.indptr.astype(index_dtype))
+    return list(matrix.shape)
+
+def _load_csr(mmap, prefix: str, shape) -> csr_matrix:
+    return csr_matrix(
+        (mmap(f"{prefix}data.npy"), mmap(f"{prefix}indices.npy"), mmap(f"{prefix}indptr.npy")),
+        shape=tuple(shape),
+        copy=False,
+    )
+
+def save_artifacts(index, base_dir: str = INDEX_ARTIFACT_DIR):
+    """
+    Write one ProductIndex build to base_dir/v<N>/ and point CURRENT at it.
+    N is index.version, which the builder must have claimed (claim_version),
+    so builds from other workers or the offline builder never overwrite each other.
+
+    Layout: vocabulary.json, idf.npy, data.npy / indices.npy / indptr.npy (the
+    CSR matrix), price.npy, shards.npz (fitment shards' row positions),
+    shard<i>.data.npy etc. (each shard's rows as its own CSR matrix, so scoring
+    a make reads mapped pages instead of copying rows), columns.json (result
+    columns) and manifest.json.
+    The directory is completed before CURRENT is replaced, so readers never
+    see a partial build.
+    """
+    version, vectorizer, built_at = index.version, index.vectorizer, index.built_at
+    name = f"v{version}"
+    target = os.path.join(base_dir, name)
+    tmp = f"{target}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    matrix = csr_matrix(index.matrix)
+    shape = _save_csr(tmp, "", matrix)
+    np.save(os.path.join(tmp, "idf.npy"), vectorizer.idf_)
+    np.save(os.path.join(tmp, "price.npy"), np.asarray(index.prices, dtype=np.float64))
+    np.savez(os.path.join(tmp, "shards.npz"), **index.shards)
+    # Make names aren't file names; the manifest maps each shard to its files
+    shard_files = {}
+    for i, (make, rows) in enumerate(sorted(index.shards.items())):
+        shard_files[make] = f"shard{i}."
+        _save_csr(tmp, shard_files[make], matrix[rows])
+
+    with open(os.path.join(tmp, "vocabulary.json"), "w") as f:
+        json.dump({term: int(i) for term, i in vectorizer.vocabulary_.items()}, f)
+    with open(os.path.join(tmp, "columns.json"), "w") as f:
+        json.dump({col: index.columns[col] for col in RESULT_COLUMNS}, f)
+
+    params = vectorizer.get_params()
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump({
+            "version": version,
+            "built_at": built_at.isoformat(),
+            "change_id": index.change_id,
+            "shape": shape,
+            "shard_files": shard_files,
+            "params": {
+                "min_df": params["min_df"],
+                "max_df": params["max_df"],
+                "stop_words": params["stop_words"],
+                "ngram_range": list(params["ngram_range"]),
+                "max_features": params["max_features"],
+                "analyzer": params["analyzer"],
+            },
+        }, f)
+
+    # Replaces the empty directory that claimed the version
+    os.replace(tmp, target)
+
+    pointer = os.path.join(base_dir, "CURRENT")
+    with open(pointer + ".tmp", "w") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    _prune_old_versions(base_dir, keep=KEEP_VERSIONS)
+    logger.info(f"Saved index artifacts {target}")
+
+def _prune_old_versions(base_dir: str, keep: int):
+    # Workers still mapping a removed version keep their pages until they reload.
+    # CURRENT's target is never removed, even if a newer build claimed more numbers.
+    current = _current_name(base_dir)
+    for version in _versions(base_dir)[:-keep]:
+        name = f"v{version}"
+        if name != current:
+            shutil.rmtree(os.path.join(base_dir, name), ignore_errors=True)
+
+def load_artifacts(base_dir: str = INDEX_ARTIFACT_DIR):
+    """
+    Load the CURRENT index build. Matrix arrays are memory-mapped read-only, so
+    every worker on the host shares the same pages instead of refitting.
+    Returns ProductIndex constructor args (columns, prices, vectorizer, matrix,
+    version, built_at, shards, change_id, shard_views), or None if nothing is built.
+    """
+    pointer = os.path.join(base_dir, "CURRENT")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        path = os.path.join(base_dir, f.read().strip())
+
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    def mmap(name):
+        return np.load(os.path.join(path, name), mmap_mode="r")
+
+    matrix = _load_csr(mmap, "", manifest["shape"])
+
+    params = dict(manifest["params"])
+    params["ngram_range"] = tuple(params["ngram_range"])
+    vectorizer = TfidfVectorizer(**params)
+    with open(os.path.join(path, "vocabulary.json")) as f:
+        vectorizer.vocabulary_ = json.load(f)
+    vectorizer.idf_ = np.load(os.path.join(path, "idf.npy"))
+
+    with open(os.path.join(path, "columns.json")) as f:
+        columns = json.load(f)
+
+    shards = {}
+    if os.path.exists(os.path.join(path, "shards.npz")):
+        with np.load(os.path.join(path, "shards.npz")) as npz:
+            shards = {make: npz[make] for make in npz.files}
+    # Builds saved before shard matrices existed slice them on first use instead
+    shard_views = {
+        make: (shards[make], _load_csr(mmap, prefix, (len(shards[make]), matrix.shape[1])))
+        for make, prefix in manifest.get("shard_files", {}).items()
+    }
+
+    logger.info(f"Loaded index artifacts {path} ({matrix.shape[0]} products, {matrix.shape[1]} features)")
+    return columns, mmap("price.npy"), vectorizer, matrix, manifest["version"], datetime.fromisoformat(manifest["built_at"]), shards, manifest.get("change_id", 0), shard_views
@@ -0,0 +1,92 @@
+import os
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Phrase dictionary: JSON object of {group: [phrase, ...]}; keys starting with "_" are ignored
+KEYWORDS_FILE = os.getenv("KEYWORDS_FILE", "data/diagnostic_terms.json")
+
+# OBD-II powertrain codes, e.g. P0420
+OBD_CODE_PATTERN = r"p\d{4}"
+
+_WORD_CHAR = re.compile(r"\w")
+
+def _trie_pattern(terms: list[str]) -> str:
+    """
+    Build a regex from a character trie of the terms, so shared prefixes are
+    tested once ("engine oil|engine oil pump" -> "engine\\ oil(?:\\ pump)?").
+    Python's re tries alternatives one by one; the trie keeps matching cost
+    close to the text length rather than the vocabulary size.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node) -> str:
+        end = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+class KeywordMatcher:
+    """
+    Finds dictionary phrases and OBD-II codes in text with compiled regexes.
+    Phrases are matched case-insensitively anywhere in the text, like a
+    substring scan, and every one is found: "engine oil pump" also yields
+    "engine oil", "headlight assembly" also "headlight" and "light assembly".
+    Acronyms written in capitals ("LED", which would hit "failed") and, with
+    whole_words=True, every term match on word boundaries only.
+    """
+
+    def __init__(self, terms, whole_words: bool = False):
+        terms = {t.strip() for t in terms if t and t.strip()}
+        words = {t.lower() for t in terms if whole_words or t.isupper()}
+        self.terms = sorted({t.lower() for t in terms})
+        substrings = [t for t in self.terms if t not in words]
+
+        # A match is the longest term at its position; the shorter ones there are its prefixes
+        # (for word-bounded terms, only those ending at a word boundary)
+        self._prefixes = {}
+        for group, bounded in ((set(substrings), False), (words, True)):
+            for term in group:
+                self._prefixes[term] = [
+                    term[:i] for i in range(len(term), 0, -1)
+                    if term[:i] in group and (not bounded or i == len(term) or not _WORD_CHAR.match(term[i]))
+                ]
+
+        # Zero-width lookahead so a match at one position doesn't hide one starting inside it
+        self._patterns = []
+        if substrings:
+            self._patterns.append(re.compile(r"(?=(" + _trie_pattern(substrings) + r"))", re.IGNORECASE))
+        alternatives = [OBD_CODE_PATTERN]
+        if words:
+            alternatives.insert(0, _trie_pattern(sorted(words)))
+        self._patterns.append(re.compile(r"(?=\b(" + "|".join(alternatives) + r")\b)", re.IGNORECASE))
+
+    @classmethod
+    def from_file(cls, path: str = KEYWORDS_FILE) -> "KeywordMatcher":
+        with open(path) as f:
+            groups = json.load(f)
+        terms = [term for key, group in groups.items() if not key.startswith("_") for term in group]
+        logger.info(f"Loaded {len(terms)} keyword phrases from {path}")
+        return cls(terms)
+
+    def find_all(self, text: str) -> list[str]:
+        """Distinct matches in order of first appearance (longest first at one position), lowercased."""
+        found = []
+        for pattern in self._patterns:
+            for m in pattern.finditer(text):
+                longest = m.group(1).lower()
+                found.extend((m.start(), -len(term), term) for term in self._prefixes.get(longest, (longest,)))
+        return list(dict.fromkeys(term for _, _, term in sorted(found)))
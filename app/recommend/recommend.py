@@ -1,13 +1,21 @@
 import os
+import asyncio
 import logging
 import traceback
+import numpy as np
 import pandas as pd
 import re
+from datetime import datetime, timezone
+from scipy import sparse
+from sqlalchemy import func
+from sqlalchemy.future import select
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-from app.db.connection import engine as sync_engine, SessionLocal as SyncSession  # Updated import
-from app.models import Product
+from app.database import AsyncSessionLocal
+from app.models import Product, CatalogChange
+from app.recommend.artifacts import claim_version, release_version, save_artifacts, load_artifacts, RESULT_COLUMNS
+from app.recommend.keywords import KeywordMatcher
+from app.recommend.shards import FitmentTagger, ShardStats, shards_from_tags, UNIVERSAL
 
 # Configure logging
 logging.basicConfig(
@@ -20,144 +28,446 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Module-level cache
-_data_cache = {
-    "df": None,
-    "vectorizer": None,
-    "matrix": None
-}
+# Compiled once; see data/diagnostic_terms.json
+_keyword_matcher = KeywordMatcher.from_file()
+# Vehicle fitment tagging; see data/car_data.json
+_fitment_tagger = FitmentTagger.from_file()
+_shard_stats = ShardStats()
 
-def _load_and_index_from_db():
-    global _data_cache
+class ProductIndex:
+    """
+    One immutable build of the product search index.
+    A new build never mutates an existing instance; it is swapped in whole.
 
-    try:
-        logger.info("Loading products from database")
-        # Load all products into a DataFrame
-        with SyncSession() as db:
-            products = db.query(
+    Result fields are stored column-wise (`columns`: plain lists for id, title,
+    manufacturer and url; `prices`: float array with NaN for unknown) so building
+    results is a list lookup rather than pandas row access.
+
+    `shards` maps a vehicle make to the row positions of products that fit it
+    (see app/recommend/shards.py); vehicle queries score only those rows plus
+    the universal ones. `shard_views` holds each shard's rows as a matrix of
+    their own: memory-mapped for builds loaded from artifacts, sliced from
+    `matrix` on first use otherwise.
+
+    `change_id` is the newest catalog_changes entry reflected in this build;
+    sync_index folds in later ones.
+    """
+
+    def __init__(self, columns: dict, prices, vectorizer, matrix, version: int, built_at: datetime, shards: dict = None, change_id: int = 0, shard_views: dict = None):
+        self.columns = columns
+        self.prices = prices
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.version = version
+        self.built_at = built_at
+        self.shards = shards or {}
+        self.change_id = change_id
+        self._shard_views = dict(shard_views or {})
+
+    def shard_view(self, shard: str):
+        """(row positions, sub-matrix) of one shard: the loaded one, else sliced on first use and cached."""
+        view = self._shard_views.get(shard)
+        if view is None:
+            rows = self.shards[shard]
+            view = (rows, self.matrix[rows])
+            self._shard_views[shard] = view
+        return view
+
+    def make_views(self, make: str):
+        """
+        Shard views to score for one make: its own shard, then the universal
+        shard (sliced once and shared by every make), or None if the make has
+        no shard.
+        """
+        if make not in self.shards:
+            return None
+        return [self.shard_view(shard) for shard in (make, UNIVERSAL) if shard in self.shards]
+
+    def __len__(self) -> int:
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0 or self.vectorizer is None
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "built_at": self.built_at.isoformat(),
+            "products": len(self),
+            "features": 0 if self.matrix is None else self.matrix.shape[1],
+            "change_id": self.change_id,
+        }
+
+    def results(self, idxs, scores=None) -> list[dict]:
+        """Materialize result dicts for the given row positions."""
+        ids, titles = self.columns["id"], self.columns["title"]
+        manufacturers, urls = self.columns["manufacturer"], self.columns["url"]
+        prices = self.prices[idxs].tolist()
+        recs = []
+        for pos, (i, price) in enumerate(zip(idxs.tolist(), prices)):
+            rec = {
+                "id": ids[i],
+                "title": titles[i],
+                "manufacturer": manufacturers[i],
+                "price": None if price != price else price,  # NaN check
+                "url": urls[i],
+            }
+            if scores is not None:
+                rec["score"] = float(scores[pos])
+            recs.append(rec)
+        return recs
+
+def top_k_indices(scores, k: int):
+    """
+    Row positions of the k highest scores, best first.
+    argpartition is O(n); only the k winners get sorted.
+    """
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        part = np.argpartition(scores, n - k)[n - k:]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(scores[part])[::-1]]
+
+# Currently served index. Readers take one reference and use only that,
+# so a concurrent swap can never hand them a half-built state.
+_current_index = None
+_build_lock = asyncio.Lock()
+_last_build_error = None
+
+# Rows fetched per round-trip from the server-side cursor while loading products
+LOAD_CHUNK_SIZE = int(os.getenv("PRODUCT_LOAD_CHUNK_SIZE", "5000"))
+# Above this share of changed products, sync_index refits instead of patching
+INDEX_INCREMENTAL_MAX_FRACTION = float(os.getenv("INDEX_INCREMENTAL_MAX_FRACTION", "0.1"))
+
+def _clean_chunk(rows):
+    """
+    Turn one chunk of product rows into result columns, prices, search texts
+    and fitment tags (CPU-bound; run in a worker thread).
+    """
+    # Turn rows into DataFrame
+    df = pd.DataFrame(rows, columns=[
+        "id", "title", "details", "manufacturer", "price", "url"
+    ])
+
+    # Fitment tags from the raw text (cleaning below strips "CR-V" style hyphens)
+    raw = df["title"].fillna("") + " " + df["details"].fillna("") + " " + df["manufacturer"].fillna("")
+    tags = [_fitment_tagger.makes(text) for text in raw]
+
+    # Clean text data by removing special characters
+    df["title"] = df["title"].str.replace(r'[^\w\s]', '', regex=True)
+    df["details"] = df["details"].str.replace(r'[^\w\s]', '', regex=True)
+    df["manufacturer"] = df["manufacturer"].str.replace(r'[^\w\s]', '', regex=True)
+
+    # Convert price to numeric
+    prices = pd.to_numeric(
+        df["price"].astype(str).str.replace(r'PKR\s*', '', regex=True).str.replace(r',', '', regex=True),
+        errors='coerce'
+    ).to_numpy(dtype=np.float64)
+
+    # Preprocess text data
+    texts = (
+        df["title"].fillna("") + " " +
+        df["details"].fillna("") + " " +
+        df["manufacturer"].fillna("")
+    ).str.lower().tolist()
+
+    columns = {col: df[col].where(df[col].notna(), None).astype(object).tolist() for col in RESULT_COLUMNS}
+    return columns, prices, texts, tags
+
+async def _load_products():
+    """
+    Stream the products table through the app's async engine (server-side
+    cursor, LOAD_CHUNK_SIZE rows at a time) and clean each chunk as it
+    arrives, so only the compact columns are ever held.
+    Returns (columns, prices, texts, fitment tags per row).
+    """
+    logger.info("Loading products from database")
+    columns = {col: [] for col in RESULT_COLUMNS}
+    prices, texts, tags = [], [], []
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            select(
                 Product.id,
                 Product.title,
                 Product.details,
                 Product.manufacturer,
                 Product.price,
                 Product.url
-            ).all()
-        
-        # Turn rows into DataFrame
-        df = pd.DataFrame(products, columns=[
-            "id", "title", "details", "manufacturer", "price", "url"
-        ])
-
-        # Clean text data by removing special characters
-        df["title"] = df["title"].str.replace(r'[^\w\s]', '', regex=True)
-        df["details"] = df["details"].str.replace(r'[^\w\s]', '', regex=True)
-        df["manufacturer"] = df["manufacturer"].str.replace(r'[^\w\s]', '', regex=True)
-
-        # Convert price to numeric
-        df["price"] = pd.to_numeric(
-            df["price"].str.replace(r'PKR\s*', '', regex=True).str.replace(r',', '', regex=True),
-            errors='coerce'
-        ).astype(float)
-
-        # Preprocess text data
-        df["combined_text"] = (
-            df["title"].fillna("") + " " +
-            df["details"].fillna("") + " " +
-            df["manufacturer"].fillna("")
-        ).str.lower()
-
-        # Build TF-IDF index
-        logger.info("Building TF-IDF index")
-        vect = TfidfVectorizer(
-            min_df=1,
-            max_df=0.95,
-            stop_words="english",
-            ngram_range=(1, 3),
-            max_features=10000,
-            analyzer='word'
+            ).execution_options(yield_per=LOAD_CHUNK_SIZE)
         )
-        mat = vect.fit_transform(df["combined_text"])
+        async for rows in result.partitions(LOAD_CHUNK_SIZE):
+            chunk_columns, chunk_prices, chunk_texts, chunk_tags = await asyncio.to_thread(_clean_chunk, rows)
+            for col in RESULT_COLUMNS:
+                columns[col].extend(chunk_columns[col])
+            prices.append(chunk_prices)
+            texts.extend(chunk_texts)
+            tags.extend(chunk_tags)
 
-        _data_cache["df"] = df
-        _data_cache["vectorizer"] = vect
-        _data_cache["matrix"] = mat
+    prices = np.concatenate(prices) if prices else np.empty(0, dtype=np.float64)
+    return columns, prices, texts, tags
 
-        logger.info(f"Indexed {mat.shape[0]} products, {mat.shape[1]} features.")
+def _fit_index(columns, prices, texts, tags, version: int, change_id: int) -> ProductIndex:
+    """Fit TF-IDF over the product texts (CPU-bound; run in a worker thread)."""
+    # Build TF-IDF index
+    logger.info("Building TF-IDF index")
+    vect = TfidfVectorizer(
+        min_df=1,
+        max_df=0.95,
+        stop_words="english",
+        ngram_range=(1, 3),
+        max_features=10000,
+        analyzer='word'
+    )
+    mat = vect.fit_transform(texts)
 
+    logger.info(f"Indexed {mat.shape[0]} products, {mat.shape[1]} features (version {version}).")
+    return ProductIndex(columns, prices, vect, mat.tocsr(), version, datetime.now(timezone.utc), shards_from_tags(tags), change_id)
+
+def _patch_index(index: ProductIndex, changed_ids: set, columns, prices, texts, tags, version: int, change_id: int) -> ProductIndex:
+    """
+    New ProductIndex with the rows of `changed_ids` replaced by their current
+    state (columns/prices/texts/tags as from _clean_chunk; ids missing from
+    them were deleted). Vocabulary and IDF weights are kept from `index`;
+    the new rows are only transformed, not refitted.
+    """
+    n = len(index)
+    keep = np.fromiter((i not in changed_ids for i in index.columns["id"]), dtype=bool, count=n)
+    kept_idx = np.flatnonzero(keep)
+
+    new_rows = index.vectorizer.transform(texts).astype(index.matrix.dtype)
+    matrix = sparse.vstack([index.matrix[kept_idx], new_rows], format="csr")
+    merged_columns = {
+        col: [index.columns[col][i] for i in kept_idx.tolist()] + list(columns[col])
+        for col in RESULT_COLUMNS
+    }
+    merged_prices = np.concatenate([np.asarray(index.prices)[kept_idx], prices])
+
+    # Renumber surviving shard rows, then append the new rows' shards
+    position = np.cumsum(keep) - 1
+    offset = len(kept_idx)
+    shards = {make: position[rows[keep[rows]]] for make, rows in index.shards.items()}
+    for make, rows in shards_from_tags(tags).items():
+        shards[make] = np.concatenate([shards.get(make, np.empty(0, dtype=np.int64)), rows + offset])
+    shards = {make: rows for make, rows in shards.items() if len(rows)}
+
+    return ProductIndex(merged_columns, merged_prices, index.vectorizer, matrix, version, datetime.now(timezone.utc), shards, change_id)
+
+async def rebuild_index(persist: bool = True) -> bool:
+    """
+    Build a new index version and swap it in atomically.
+    On failure the previously served version stays in place.
+    With persist, the build is also written as memory-mappable artifacts
+    so other workers can start from it without refitting.
+    Concurrent calls are serialized.
+    """
+    global _current_index, _last_build_error
+    async with _build_lock:
+        version = _current_index.version + 1 if _current_index else 1
+        claimed = None
+        try:
+            # Read before the products, so changes logged mid-load are folded in again by sync_index
+            change_id = await _latest_change_id()
+            loaded = await _load_products()
+            if persist:
+                # Numbered on disk before the index exists, so it is published with its final version
+                version = claimed = await asyncio.to_thread(claim_version, version)
+            new_index = await asyncio.to_thread(_fit_index, *loaded, version, change_id)
+        except Exception:
+            if claimed:
+                release_version(claimed)
+            _last_build_error = traceback.format_exc()
+            logger.error("Error loading/indexing products, keeping previous index:\n" + _last_build_error)
+            return False
+        _current_index = new_index
+        _last_build_error = None
+
+    if persist:
+        try:
+            await asyncio.to_thread(save_artifacts, new_index)
+        except Exception:
+            release_version(new_index.version)
+            logger.error("Error saving index artifacts:\n" + traceback.format_exc())
+    return True
+
+def load_prebuilt_index() -> bool:
+    """
+    Swap in the prebuilt index from disk (see scripts/build_product_index.py).
+    Returns False if no artifacts exist or they can't be read.
+    """
+    global _current_index
+    try:
+        loaded = load_artifacts()
     except Exception:
-        logger.error("Error loading/indexing products:\n" + traceback.format_exc())
-        _data_cache = {"df": pd.DataFrame(), "vectorizer": None, "matrix": None}
+        logger.error("Error loading index artifacts:\n" + traceback.format_exc())
+        return False
+    if loaded is None:
+        return False
+    _current_index = ProductIndex(*loaded)
+    return True
+
+def get_index():
+    """Return the currently served ProductIndex, or None before the first successful build."""
+    return _current_index
+
+def index_status() -> dict:
+    index = _current_index
+    return {
+        "ready": _index_ready,
+        "building": _build_lock.locked(),
+        "current": index.info() if index else None,
+        "sharding": _shard_stats.report(index.shards) if index else None,
+        "last_error": _last_build_error.strip().splitlines()[-1] if _last_build_error else None,
+    }
+
+# Set once the startup warm-up has finished (successfully or not)
+_index_ready = False
+
+async def warm_up_index():
+    """
+    Build the product index ahead of the first request.
+    Run it as a background task at startup.
+    """
+    global _index_ready
+    # Prefer the memory-mapped prebuilt index; fall back to building from the database
+    if not await asyncio.to_thread(load_prebuilt_index):
+        await rebuild_index()
+    else:
+        # Catch up on catalog changes made since the artifacts were built
+        try:
+            await sync_index()
+        except Exception:
+            logger.error("Error syncing prebuilt index with the catalog:\n" + traceback.format_exc())
+    _index_ready = True
+
+def index_ready() -> bool:
+    return _index_ready
+
+async def _latest_change_id() -> int:
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(func.coalesce(func.max(CatalogChange.id), 0)))).scalar()
+
+async def sync_index() -> bool:
+    """
+    Fold catalog changes logged since the current build (see app/db/catalog.py)
+    into a new index version: changed and deleted products are dropped and
+    their current rows transformed and appended, without refitting TF-IDF.
+    Falls back to a full rebuild when there is no index yet, when more than
+    INDEX_INCREMENTAL_MAX_FRACTION of the catalog changed (the IDF weights
+    would drift), when the log was pruned past the current build, or when
+    applying the changes fails.
+    Returns True if a new version was swapped in.
+    """
+    global _current_index, _last_build_error
+    index = _current_index
+    if index is None or index.empty:
+        return await rebuild_index()
+
+    async with AsyncSessionLocal() as db:
+        oldest_id, last_id = (await db.execute(
+            select(func.min(CatalogChange.id), func.max(CatalogChange.id))
+        )).one()
+        if last_id is None or last_id <= index.change_id:
+            return False
+        # Retention pruning removes the oldest entries first
+        pruned = oldest_id > index.change_id + 1
+
+        changed = (
+            select(CatalogChange.product_id).distinct()
+            .where(CatalogChange.id > index.change_id, CatalogChange.id <= last_id)
+        )
+        changed_ids = set((await db.execute(changed)).scalars())
+
+    if pruned or len(changed_ids) > INDEX_INCREMENTAL_MAX_FRACTION * len(index):
+        logger.info(f"{len(changed_ids)} products changed, rebuilding index")
+        return await rebuild_index()
+
+    async with _build_lock:
+        if _current_index is not index:
+            return False  # rebuilt meanwhile; the next sync picks up from there
+        try:
+            async with AsyncSessionLocal() as db:
+                # Subquery, not an IN list: that many ids would exceed the driver's bind parameter limit
+                rows = (await db.execute(
+                    select(
+                        Product.id,
+                        Product.title,
+                        Product.details,
+                        Product.manufacturer,
+                        Product.price,
+                        Product.url
+                    ).where(Product.id.in_(changed.scalar_subquery()))
+                )).all()
+            loaded = await asyncio.to_thread(_clean_chunk, rows)
+            new_index = await asyncio.to_thread(
+                _patch_index, index, changed_ids, *loaded, index.version + 1, last_id
+            )
+        except Exception:
+            new_index = None
+            logger.error("Error applying catalog changes incrementally, rebuilding instead:\n" + traceback.format_exc())
+        else:
+            _current_index = new_index
+            _last_build_error = None
+
+    # A failing patch would fail again on every watcher tick; a full build starts clean
+    if new_index is None:
+        return await rebuild_index()
+
+    logger.info(f"Applied {len(changed_ids)} catalog changes incrementally (version {new_index.version})")
+    return True
 
 def _extract_keywords(text):
     """Extract relevant keywords from the diagnosis text."""
-    front_light_terms = [
-        'front light', 'headlight', 'head lamp', 'light bulb', 'lighting issue',
-        'dim light', 'flickering light', 'burnt-out bulb', 'halogen', 'LED',
-        'light socket', 'bulb holder', 'light assembly', 'headlight assembly',
-        'light switch', 'light cover', 'light trim', 'light bracket', 'light housing'
-    ]
-    
-    text_lower = text.lower()
-    keywords = [term for term in front_light_terms if term in text_lower]
-    
-    codes = re.findall(r'\b[pP]\d{4}\b', text)
-    keywords.extend(codes)
-
-    additional_terms = [
-        'check engine light', 'oil change', 'tire rotation', 'alignment', 'air filter',
-        'brake pads', 'brake rotors', 'coolant', 'oil leak', 'battery terminal',
-        'spark plugs', 'fuel filter', 'airbag', 'steering wheel', 'seatbelt',
-        'wipers', 'windshield washer', 'battery charger', 'alternator belt',
-        'oil pressure', 'temperature gauge', 'fuel gauge', 'tire pressure',
-        'brake fluid', 'coolant level', 'air conditioning', 'heating system',
-        'engine oil', 'engine coolant', 'engine air filter', 'engine spark plugs',
-        'engine timing belt', 'engine water pump', 'engine oil pump', 'engine alternator',
-        'engine starter', 'engine clutch', 'engine differential', 'engine catalytic converter',
-        'engine oxygen sensor', 'engine mass airflow', 'engine throttle body', 'engine ignition coil',
-        'engine fuel injector', 'engine turbocharger', 'engine supercharger', 'engine shock absorber',
-        'engine strut', 'engine control arm', 'engine ball joint', 'engine tie rod', 'engine wheel bearing',
-        'engine cv joint', 'engine serpentine belt', 'engine power steering', 'engine ac compressor',
-        'engine heater core', 'engine thermostat', 'engine head gasket', 'engine piston',
-        'engine crankshaft', 'engine camshaft', 'engine valve', 'engine cylinder head'
-    ]
-    
-    keywords.extend([term for term in additional_terms if term in text_lower])
-    
-    return " ".join(keywords)
+    return " ".join(_keyword_matcher.find_all(text))
+
+def _process_query(query: str) -> str:
+    return _extract_keywords(query) + " " + query.lower()
 
-def recommend_products(query: str, top_k: int = 5) -> list[dict]:
+def recommend_products(query: str, top_k: int = 5, manufacturer: str = None) -> list[dict]:
     """
     Query the TF-IDF index built from the products table,
     returning up to top_k matches as dicts.
+    With a vehicle `manufacturer`, only that make's shard plus universal
+    products are scored; unknown makes fall back to the full catalog.
     """
     logger.info(f"Recommending products for query: {query[:50]}")
-    if _data_cache["df"] is None:
-        _load_and_index_from_db()
-
-    df = _data_cache["df"]
-    vect = _data_cache["vectorizer"]
-    mat = _data_cache["matrix"]
-
-    if df.empty or vect is None or mat is None:
+    index = _current_index
+    if index is None or index.empty:
         logger.warning("Recommendation engine not ready or no data.")
         return []
 
     try:
-        processed_query = _extract_keywords(query) + " " + query.lower()
-        qv = vect.transform([processed_query])
-        sims = cosine_similarity(qv, mat).flatten()
-        top_idxs = sims.argsort()[:-top_k - 1:-1]
+        qv = index.vectorizer.transform([_process_query(query)])
+        make = manufacturer.strip().lower() if manufacturer else None
+        views = index.make_views(make) if make else None
 
-        recs = []
-        for idx in top_idxs:
-            row = df.iloc[idx]
-            recs.append({
-                "id": int(row["id"]),
-                "title": row["title"],
-                "manufacturer": row["manufacturer"],
-                "price": float(row["price"]) if pd.notna(row["price"]) else None,
-                "url": row["url"]
-            })
+        # TF-IDF rows and the query are L2-normalized, so the dot product is the cosine
+        if views is not None:
+            # Top k of each shard, then the top k of those
+            idxs, scores = [], []
+            for rows, sub in views:
+                sims = (sub @ qv.T).toarray().ravel()
+                best = top_k_indices(sims, top_k)
+                idxs.append(rows[best])
+                scores.append(sims[best])
+            idxs, scores = np.concatenate(idxs), np.concatenate(scores)
+            best = top_k_indices(scores, top_k)
+            top_idxs, top_scores = idxs[best], scores[best]
+            own = index.shards[make]
+            _shard_stats.record(make, bool(np.any((top_scores > 0) & np.isin(top_idxs, own))))
+        else:
+            if make:
+                _shard_stats.record_fallback()
+            sims = (index.matrix @ qv.T).toarray().ravel()
+            top_idxs = top_k_indices(sims, top_k)
+            top_scores = sims[top_idxs]
+
+        recs = index.results(top_idxs, top_scores)
 
         logger.info(f"Returning {len(recs)} recommendations.")
         return recs
@@ -165,3 +475,72 @@ def recommend_products(query: str, top_k: int = 5) -> list[dict]:
     except Exception:
         logger.error("Error during recommendation:\n" + traceback.format_exc())
         return []
+
+def recommend_products_batch(queries: list[str], top_k: int = 5, manufacturers: list = None, chunk_size: int = 512) -> list[list[dict]]:
+    """
+    Score many queries at once: one vectorizer.transform and one sparse
+    matrix product per chunk of `chunk_size` queries, which bounds memory.
+    Returns one result list per query, in input order. Only products sharing
+    at least one term with the query are returned. `manufacturers` gives each
+    query's vehicle make, restricting it to the same shards as recommend_products.
+    """
+    logger.info(f"Batch recommending products for {len(queries)} queries")
+    index = _current_index
+    if index is None or index.empty:
+        logger.warning("Recommendation engine not ready or no data.")
+        return [[] for _ in queries]
+
+    # make -> mask of the rows its queries may return (None: full catalog)
+    allowed = {}
+
+    def allowed_rows(make):
+        if make not in allowed:
+            views = index.make_views(make) if make else None
+            mask = None
+            if views is not None:
+                mask = np.zeros(len(index), dtype=bool)
+                for rows, _ in views:
+                    mask[rows] = True
+            allowed[make] = mask
+        return allowed[make]
+
+    results = []
+    try:
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            qm = index.vectorizer.transform([_process_query(q) for q in chunk])
+            # (queries x products) cosine scores, sparse: only overlapping products are stored
+            sims = (qm @ index.matrix.T).tocsr()
+            for row in range(sims.shape[0]):
+                lo, hi = sims.indptr[row], sims.indptr[row + 1]
+                scores, cols = sims.data[lo:hi], sims.indices[lo:hi]
+                make = manufacturers[start + row] if manufacturers else None
+                mask = allowed_rows(make.strip().lower() if make else None)
+                if mask is not None:
+                    keep = mask[cols]
+                    scores, cols = scores[keep], cols[keep]
+                best = top_k_indices(scores, top_k)
+                results.append(index.results(cols[best], scores[best]))
+        return results
+
+    except Exception:
+        logger.error("Error during batch recommendation:\n" + traceback.format_exc())
+        return results + [[] for _ in queries[len(results):]]
+
+async def recommend_products_async(query: str, top_k: int = 5, manufacturer: str = None) -> list[dict]:
+    """
+    Non-blocking recommend_products for request handlers.
+    Scoring runs in a worker thread; returns [] while the index is still warming up
+    instead of building it inside the request.
+    """
+    if not _index_ready:
+        logger.info("Recommendation index still warming up; skipping recommendations.")
+        return []
+    return await asyncio.to_thread(recommend_products, query, top_k, manufacturer)
+
+async def recommend_products_batch_async(queries: list[str], top_k: int = 5) -> list[list[dict]]:
+    """Non-blocking recommend_products_batch; same warm-up rule as recommend_products_async."""
+    if not _index_ready:
+        logger.info("Recommendation index still warming up; skipping recommendations.")
+        return [[] for _ in queries]
+    return await asyncio.to_thread(recommend_products_batch, queries, top_k)
@@ -0,0 +1,94 @@
+import os
+import json
+import logging
+import threading
+from collections import defaultdict
+import numpy as np
+
+from app.recommend.keywords import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+# Make -> models, used to tag which vehicles a product fits
+FITMENT_FILE = os.getenv("FITMENT_FILE", "data/car_data.json")
+
+# Products that mention no vehicle fit everything
+UNIVERSAL = "_universal"
+
+# Model names that are ordinary words, or too short, to imply a make on their own
+_AMBIGUOUS_MODELS = {"escape", "focus", "pilot", "soul", "atlas", "golf", "forte", "move", "ravi"}
+
+class FitmentTagger:
+    """
+    Tags free text with the vehicle makes it mentions, either by make name
+    ("Toyota") or by an unambiguous model name ("Corolla" -> toyota).
+    """
+
+    def __init__(self, car_data: dict):
+        self.term_to_make = {}
+        for make, models in car_data.items():
+            key = make.lower()
+            self.term_to_make[key] = key
+            for model in models:
+                model = model.lower()
+                if len(model) >= 4 and model not in _AMBIGUOUS_MODELS:
+                    self.term_to_make.setdefault(model, key)
+        self._matcher = KeywordMatcher(self.term_to_make.keys(), whole_words=True)
+
+    @classmethod
+    def from_file(cls, path: str = FITMENT_FILE) -> "FitmentTagger":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def makes(self, text: str) -> set:
+        return {self.term_to_make[t] for t in self._matcher.find_all(text) if t in self.term_to_make}
+
+def shards_from_tags(tags) -> dict:
+    """
+    Partition product rows by fitment: {make: row positions}, plus UNIVERSAL
+    for rows that name no vehicle. `tags` holds each row's set of makes
+    (FitmentTagger.makes). A product fitting several makes appears in each.
+    """
+    rows = defaultdict(list)
+    for i, makes in enumerate(tags):
+        for make in makes or (UNIVERSAL,):
+            rows[make].append(i)
+    return {make: np.asarray(idx, dtype=np.int64) for make, idx in rows.items()}
+
+def build_shards(texts, tagger: FitmentTagger) -> dict:
+    """Tag each product text and partition the rows (see shards_from_tags)."""
+    return shards_from_tags(tagger.makes(text) for text in texts)
+
+class ShardStats:
+    """Per-shard query and hit counters (a hit = at least one result came from the vehicle's own shard)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = defaultdict(int)
+        self.hits = defaultdict(int)
+        self.fallbacks = 0
+
+    def record(self, make: str, hit: bool):
+        with self._lock:
+            self.queries[make] += 1
+            if hit:
+                self.hits[make] += 1
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def report(self, shards: dict) -> dict:
+        with self._lock:
+            return {
+                "shards": {
+                    make: {
+                        "products": int(len(rows)),
+                        "queries": self.queries[make],
+                        "hits": self.hits[make],
+                        "hit_rate": round(self.hits[make] / self.queries[make], 3) if self.queries[make] else None,
+                    }
+                    for make, rows in sorted(shards.items())
+                },
+                "full_catalog_fallbacks": self.fallbacks,
+            }
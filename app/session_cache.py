@@ -0,0 +1,115 @@
+"""
+Per-process cache of chat session metadata (vehicle, text size, owner).
+
+Chat, upload and history requests all start by loading their ChatSession, and
+a session's vehicle never changes, so steady-state turns can skip that
+round-trip. Entries are SessionInfo snapshots, not ORM objects, so they
+outlive the request's db session. With SESSION_CACHE_MISS_TTL > 0 unknown ids
+are cached as misses too (off by default: another worker may create the id).
+
+Writers in this process invalidate after committing (session creation, text
+size, restore, archival, clear-history); other workers' writes show up once
+the TTL expires. archived_at is advisory only: the chat context load and
+transcript reads check it against the database.
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy.future import select
+
+from app.models import ChatSession
+
+logger = logging.getLogger(__name__)
+
+# Session cache settings (overridable via environment)
+SESSION_CACHE_ENABLED = os.getenv("SESSION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "300"))            # seconds
+SESSION_CACHE_MISS_TTL = float(os.getenv("SESSION_CACHE_MISS_TTL", "0"))    # seconds, for unknown ids; 0 disables
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+
+class SessionInfo:
+    """Read-only snapshot of the ChatSession columns request handlers use."""
+
+    __slots__ = ("id", "user_id", "manufacturer", "model", "year", "created_at", "text_size", "archived_at")
+
+    def __init__(self, session: ChatSession):
+        for name in self.__slots__:
+            object.__setattr__(self, name, getattr(session, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SessionInfo is read-only; update ChatSession and invalidate the cache")
+
+class SessionCache:
+    """In-process LRU with per-entry TTL; None entries record unknown ids."""
+
+    def __init__(self, max_entries: int = SESSION_CACHE_MAX_ENTRIES, ttl: float = SESSION_CACHE_TTL,
+                 miss_ttl: float = SESSION_CACHE_MISS_TTL, enabled: bool = SESSION_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.enabled = enabled
+        self._entries = OrderedDict()  # session id -> (expires_at, SessionInfo or None)
+        # Bumped by every invalidation; a load that raced one doesn't store its (possibly stale) row
+        self._generation = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def load(self, db, session_id: str, fresh: bool = False) -> Optional[SessionInfo]:
+        """
+        The session's metadata, or None if no such session exists. fresh=True
+        reads the database even on a cached entry, and stores the fresh row.
+        """
+        if self.enabled and not fresh:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                if entry[0] >= time.monotonic():
+                    self._entries.move_to_end(session_id)
+                    if entry[1] is None:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    return entry[1]
+                del self._entries[session_id]
+
+        self.misses += 1
+        generation = self._generation
+        res = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
+        session = res.scalars().first()
+        info = SessionInfo(session) if session else None
+        if self.enabled and generation == self._generation and (info or self.miss_ttl > 0):
+            self._entries[session_id] = (time.monotonic() + (self.ttl if info else self.miss_ttl), info)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return info
+
+    def invalidate(self, *session_ids: str):
+        """Drop entries after a committed write to those sessions."""
+        self._generation += 1
+        self.invalidations += len(session_ids)
+        for session_id in session_ids:
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 3) if lookups else None,
+        }
+
+# Shared by the request handlers and the background jobs that write sessions
+session_cache = SessionCache()
@@ -2,23 +2,34 @@ import os
 import logging
 import uuid
 import json
-from datetime import datetime, timezone
+import base64
+import asyncio
+from datetime import datetime, timezone, timedelta
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Request, Form, File, UploadFile, Depends
+from fastapi import FastAPI, HTTPException, Request, Form, File, UploadFile, Depends, BackgroundTasks, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy import desc, func, delete
+from sqlalchemy import desc, func, update
+from typing import Optional
 # Your modules
 from app.llm.diagnose_llm import DiagnoseLLM
-from app.recommend.recommend import recommend_products
-from app.database import get_db, engine, Base
-from app.models import ChatSession, Message
+from app.llm.context import ConversationContext
+from app.recommend.recommend import (
+    recommend_products_async, recommend_products_batch_async, warm_up_index, index_ready, rebuild_index, index_status, sync_index,
+)
+from app.database import get_db, engine, AsyncSessionLocal
+from app.models import ChatSession, Message, MessageProduct, PurgeJob
+from app.queries import history_page_query, transcript_query, top_products_query, NULL_CREATED_AT
+from app.db.migrations import run_migrations
+from app.db.purge import create_job, start_job, resume_jobs, job_dict
+from app.db.archive import maintain, ensure_partitions, restore_session
+from app.session_cache import session_cache
+from app.images import save_upload, is_upload_url, UploadTooLarge, InvalidImage
 
 # Load environment variables
 load_dotenv()
@@ -27,14 +38,50 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# Seconds between catalog change checks (0 disables the watcher)
+INDEX_REFRESH_INTERVAL = int(os.getenv("INDEX_REFRESH_INTERVAL", "0"))
+# Seconds between message-partition/archival passes (0: partitions are only checked at startup)
+HISTORY_MAINTENANCE_INTERVAL = int(os.getenv("HISTORY_MAINTENANCE_INTERVAL", "3600"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Fold catalog changes (see app/db/catalog.py) into the product index as they land
+async def _watch_catalog():
+    while True:
+        try:
+            await sync_index()
+        except Exception as e:
+            logger.error(f"Catalog watcher error: {e}")
+        await asyncio.sleep(INDEX_REFRESH_INTERVAL)
+
+# Keep monthly message partitions ahead of the clock and archive idle sessions (see app/db/archive.py)
+async def _maintain_history():
+    while True:
+        try:
+            await maintain()
+        except Exception as e:
+            logger.error(f"History maintenance error: {e}")
+        await asyncio.sleep(HISTORY_MAINTENANCE_INTERVAL)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("Database tables created")
+    await run_migrations(engine)
+    # Finish clear-history jobs a previous process left behind
+    await resume_jobs()
+    # Build the product index in the background so startup isn't blocked on it
+    app.state.index_warmup = asyncio.create_task(warm_up_index())
+    watcher = asyncio.create_task(_watch_catalog()) if INDEX_REFRESH_INTERVAL > 0 else None
+    if HISTORY_MAINTENANCE_INTERVAL > 0:
+        maintenance = asyncio.create_task(_maintain_history())
+    else:
+        maintenance = None
+        await ensure_partitions()
     yield
     # Shutdown
+    if watcher:
+        watcher.cancel()
+    if maintenance:
+        maintenance.cancel()
     await engine.dispose()
 
 # Initialize FastAPI with lifespan
@@ -61,6 +108,7 @@ templates = Jinja2Templates(directory="templates")
 
 # Initialize your LLM
 diagnose_llm = DiagnoseLLM()
+conversation_context = ConversationContext()
 
 # Pydantic schemas
 class CarDetails(BaseModel):
@@ -71,11 +119,79 @@ class CarDetails(BaseModel):
 class ChatRequest(BaseModel):
     session_id: str
     message: str
+    bypass_cache: bool = False  # always ask the model, skipping the LLM response cache
+    image_url: Optional[str] = None  # file_url from /api/upload-image, stored on the user Message
+
+class BatchRecommendRequest(BaseModel):
+    queries: list[str] = Field(..., max_length=1000)
+    top_k: int = Field(5, ge=1, le=50)
 
 class TextSizeRequest(BaseModel):
     session_id: str
     size: str
 
+# Readiness probe
+@app.get("/api/ready")
+async def ready():
+    return {"recommendations_ready": index_ready()}
+
+# Admin endpoints require the X-Admin-Token header to match ADMIN_TOKEN
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+# Product index version / build status
+@app.get("/api/admin/index", dependencies=[Depends(require_admin)])
+async def get_index_status():
+    return index_status()
+
+# Rebuild the product index in the background; the old version serves until the swap
+@app.post("/api/admin/index/rebuild", dependencies=[Depends(require_admin)])
+async def trigger_index_rebuild(background_tasks: BackgroundTasks):
+    background_tasks.add_task(rebuild_index)
+    return {"scheduled": True, **index_status()}
+
+# LLM response cache hit/miss counters (exact and near-duplicate)
+@app.get("/api/admin/llm-cache", dependencies=[Depends(require_admin)])
+async def get_llm_cache_stats():
+    return {
+        **diagnose_llm.cache.stats(),
+        "semantic": diagnose_llm.semantic_cache.stats(),
+        "known_issue_answers": diagnose_llm.known_issues.direct_answers,
+    }
+
+# Drop every cached LLM answer (e.g. after changing the system prompt or model)
+@app.delete("/api/admin/llm-cache", dependencies=[Depends(require_admin)])
+async def clear_llm_cache():
+    await diagnose_llm.cache.clear()
+    diagnose_llm.semantic_cache.clear()
+    return {**diagnose_llm.cache.stats(), "semantic": diagnose_llm.semantic_cache.stats()}
+
+# Products recommended most often over the last `days` days
+@app.get("/api/admin/top-products", dependencies=[Depends(require_admin)])
+async def top_products(
+    days: int = Query(7, ge=1, le=365),
+    limit: int = Query(20, ge=1, le=200),
+    db: AsyncSession = Depends(get_db, scope="function"),
+):
+    since = utcnow_naive() - timedelta(days=days)
+    rows = (await db.execute(top_products_query(since, limit))).all()
+    return {
+        "since": since.isoformat(),
+        "products": [{**_product_dict(product), "times_recommended": n} for product, n in rows],
+    }
+
+# Session metadata cache hit/miss counters
+@app.get("/api/admin/session-cache", dependencies=[Depends(require_admin)])
+async def get_session_cache_stats():
+    return session_cache.stats()
+
+# Score many queries in one call (back-office tools)
+@app.post("/api/recommend/batch", dependencies=[Depends(require_admin)])
+async def recommend_batch(req: BatchRecommendRequest):
+    results = await recommend_products_batch_async(req.queries, top_k=req.top_k)
+    return {"results": results}
+
 # Root endpoint
 @app.get("/")
 async def root(request: Request):
@@ -87,12 +203,25 @@ from datetime import datetime, timezone
 def utcnow_naive():
     return datetime.now(timezone.utc).replace(tzinfo=None)
 
+# Opaque keyset-pagination cursors: (datetime, id) <-> url-safe string
+def _encode_cursor(when: datetime, key) -> str:
+    return base64.urlsafe_b64encode(json.dumps([when.isoformat(), key]).encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        when, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        when = datetime.fromisoformat(when)
+        # Naive timestamps are written as UTC (see utcnow_naive)
+        return (when if when.tzinfo else when.replace(tzinfo=timezone.utc)), key
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 # Start a new chat session
 @app.post("/api/session")
 async def create_new_session(
     car_details: CarDetails,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
     try:
         session_id = str(uuid.uuid4())
@@ -105,8 +234,6 @@ async def create_new_session(
             created_at=utcnow_naive()
         )
         db.add(db_session)
-        await db.commit()
-        await db.refresh(db_session)
 
         # Add initial system message with car details
         system_msg = Message(
@@ -126,7 +253,10 @@ async def create_new_session(
         )
         db.add(welcome_msg)
 
+        # Committed here rather than by get_db: the cache must be invalidated after the
+        # commit, or a lookup in between could cache the id as unknown again
         await db.commit()
+        session_cache.invalidate(session_id)
         logger.info(f"Created session {session_id} for {car_details.year} {car_details.manufacturer} {car_details.model}")
         return {"session_id": session_id, "car_details": car_details}
     except Exception as e:
@@ -134,54 +264,67 @@ async def create_new_session(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Load the session and its history, and stage the new user message
+async def _prepare_chat_turn(db: AsyncSession, chat_req: ChatRequest):
+    """
+    Returns (session, messages) where session is a SessionInfo and messages is the
+    history plus the new user turn. Archived sessions are restored by
+    conversation_context.load, which reads archived_at from the database.
+    The user Message is added (not flushed); the request's unit of work commits it.
+    Raises HTTPException(404) for unknown sessions and 400 for an image_url
+    that isn't an upload.
+    """
+    if chat_req.image_url and not is_upload_url(chat_req.image_url):
+        raise HTTPException(status_code=400, detail="Invalid image_url")
+
+    # Load session metadata (usually from the session cache)
+    session = await session_cache.load(db, chat_req.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    # Bounded history: rolling summary + most recent turns
+    messages = await conversation_context.load(db, session.id)
+
+    # Add the new user message
+    messages.append({
+        "role": "user",
+        "content": chat_req.message
+    })
+    
+    # Persist user message to database
+    user_msg = Message(
+        session_id=session.id,
+        role="user",
+        content=chat_req.message,
+        timestamp=utcnow_naive(),
+        car_image=chat_req.image_url,
+    )
+    db.add(user_msg)
+    return session, messages
+
+# Fold old turns into the session summary, after the response is sent
+async def _compact_context(session_id: str):
+    async with AsyncSessionLocal() as db:
+        try:
+            await conversation_context.compact(db, session_id, diagnose_llm)
+        except Exception as e:
+            logger.error(f"Context compaction error: {e}")
+
 # Chat endpoint
 @app.post("/api/chat")
 async def chat(
     chat_req: ChatRequest,
-    db: AsyncSession = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
     try:
-        # Load session
-        res = await db.execute(select(ChatSession).where(ChatSession.id == chat_req.session_id))
-        session = res.scalars().first()
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
-        
-        # Get the conversation history for this session
-        msg_res = await db.execute(
-            select(Message).where(Message.session_id == session.id).order_by(Message.timestamp)
-        )
-        history_messages = msg_res.scalars().all()
-        
-        # Prepare message history
-        messages = []
-        for msg in history_messages:
-            messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
-
-        # Add the new user message
-        messages.append({
-            "role": "user",
-            "content": chat_req.message
-        })
-        
-        # Persist user message to database
-        user_msg = Message(
-            session_id=session.id,
-            role="user",
-            content=chat_req.message,
-            timestamp=utcnow_naive(),
-        )
-        db.add(user_msg)
-        await db.flush()
+        session, messages = await _prepare_chat_turn(db, chat_req)
         
         # Call DiagnoseLLM with the full message history and session context
-        diagnosis = await diagnose_llm.get_diagnosis(messages, session)
+        diagnosis = await diagnose_llm.get_diagnosis(messages, session, bypass_cache=chat_req.bypass_cache)
         
         # Get recommendations based on the diagnosis
-        products = recommend_products(diagnosis, top_k=3)
+        products = await recommend_products_async(diagnosis, top_k=3, manufacturer=session.manufacturer)
         
         # Prepare assistant message content — ONLY the diagnosis now
         assist_content = diagnosis
@@ -192,13 +335,15 @@ async def chat(
             role="assistant",
             content=assist_content,
             timestamp=utcnow_naive(),
-            products=json.dumps(products) if products else None,
+            recommendations=_recommendations(products),
         )
         db.add(assist_msg)
-        await db.commit()
+        # Inserts both messages and the recommendations in one flush (and assigns ids for the cursor); get_db commits
+        await db.flush()
+        background_tasks.add_task(_compact_context, session.id)
 
         # Return both message and products as separate fields — front-end can display products separately
-        return {"message": assist_content, "products": products}
+        return {"message": assist_content, "products": products, "cursor": _encode_cursor(assist_msg.timestamp, assist_msg.id)}
     except HTTPException:
         raise
     except Exception as e:
@@ -206,21 +351,105 @@ async def chat(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Recommender results -> MessageProduct rows for the assistant message
+def _recommendations(products: list) -> list:
+    return [
+        MessageProduct(product_id=p["id"], rank=rank, score=p.get("score"))
+        for rank, p in enumerate(products or [], 1)
+    ]
+
+# Same shape as the recommender's result dicts
+def _product_dict(product, score: Optional[float] = None) -> dict:
+    rec = {
+        "id": product.id,
+        "title": product.title,
+        "manufacturer": product.manufacturer,
+        "price": product.price,
+        "url": product.url,
+    }
+    if score is not None:
+        rec["score"] = score
+    return rec
+
+# Format one Server-Sent Event
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming chat endpoint (Server-Sent Events)
+@app.post("/api/chat/stream")
+async def chat_stream(
+    chat_req: ChatRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db, scope="function"),
+):
+    """
+    Same as /api/chat, but streams the reply as it is generated.
+    Events: "token" ({"content": ...}) per chunk, then "products" (list) and
+    "done" ({"message": ..., "cursor": ...}; cursor as in /api/history/{session_id}).
+    The assistant Message is persisted once the full reply is known.
+    """
+    try:
+        session, messages = await _prepare_chat_turn(db, chat_req)
+        # Commit the user turn before streaming starts; the reply is saved with its own session
+        await db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        parts = []
+        async for piece in diagnose_llm.stream_diagnosis(messages, session, bypass_cache=chat_req.bypass_cache):
+            parts.append(piece)
+            yield _sse("token", {"content": piece})
+        diagnosis = "".join(parts)
+
+        try:
+            products = await recommend_products_async(diagnosis, top_k=3, manufacturer=session.manufacturer)
+
+            # The request's db session may already be closed, so persist with a fresh one
+            assist_msg = Message(
+                session_id=session.id,
+                role="assistant",
+                content=diagnosis,
+                timestamp=utcnow_naive(),
+                recommendations=_recommendations(products),
+            )
+            async with AsyncSessionLocal() as save_db:
+                save_db.add(assist_msg)
+                await save_db.commit()
+        except Exception as e:
+            logger.error(f"Chat stream persist error: {e}")
+            yield _sse("error", {"detail": str(e)})
+            return
+
+        yield _sse("products", products)
+        yield _sse("done", {"message": diagnosis, "cursor": _encode_cursor(assist_msg.timestamp, assist_msg.id)})
+
+    background_tasks.add_task(_compact_context, session.id)
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 # Set text size preference
 @app.post("/api/set-text-size")
 async def set_text_size(
     req: TextSizeRequest,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
     try:
-        res = await db.execute(select(ChatSession).where(ChatSession.id == req.session_id))
-        session = res.scalars().first()
+        session = await session_cache.load(db, req.session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session.text_size = req.size
+        await db.execute(update(ChatSession).where(ChatSession.id == session.id).values(text_size=req.size))
+        # Commit before invalidating, so no concurrent lookup re-caches the old size
         await db.commit()
+        session_cache.invalidate(session.id)
         return {"success": True}
     except HTTPException:
         raise
@@ -228,70 +457,118 @@ async def set_text_size(
         logger.error(f"Set text-size error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Get list of sessions (history)
+# Get list of sessions (history), newest first, one page at a time
 @app.get("/api/history")
 async def get_history(
-    db: AsyncSession = Depends(get_db),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
     try:
-        # Get all sessions
-        res = await db.execute(
-            select(ChatSession).order_by(desc(ChatSession.created_at))
-        )
-        sessions = res.scalars().all()
-        history = []
-        for sess in sessions:
-            # Last message
-            last_res = await db.execute(
-                select(Message).where(Message.session_id == sess.id).order_by(desc(Message.timestamp)).limit(1)
-            )
-            last = last_res.scalars().first()
-            # Count messages
-            message_count = await db.scalar(
-                select(func.count()).select_from(Message).where(Message.session_id == sess.id)
-            )
-            history.append({
+        # Last message and message count per session, fetched in the same query
+        query = history_page_query(limit + 1, after=_decode_cursor(cursor) if cursor else None)
+
+        rows = (await db.execute(query)).all()
+        page = rows[:limit]
+        history = [
+            {
                 "id": sess.id,
                 "car_details": {"manufacturer": sess.manufacturer, "model": sess.model, "year": sess.year},
                 "created_at": sess.created_at.isoformat() if sess.created_at else "",
-                "last_message": last.content if last else "",
-                "message_count": message_count,
-            })
-        return {"sessions": history}
+                "last_message": last_content or "",
+                "message_count": count or 0,
+            }
+            for sess, last_content, count in page
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = page[-1][0]
+            next_cursor = _encode_cursor(last.created_at or NULL_CREATED_AT, last.id)
+        return {"sessions": history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"History error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Get a specific session's full history
+# Serialize one transcript message; "cursor" resumes the transcript after it
+def _message_dict(m: Message, products: list) -> dict:
+    return {
+        "role": m.role,
+        "content": m.content,
+        "timestamp": m.timestamp.isoformat(),
+        "car_image": m.car_image,
+        "products": products or None,
+        "cursor": _encode_cursor(m.timestamp, m.id),
+    }
+
+# transcript_query yields one row per recommended product; fold them back into messages
+async def _fold_products(rows):
+    current, products = None, []
+    async for m, score, product in rows:
+        if current is not None and m.id != current.id:
+            yield current, products
+            products = []
+        current = m
+        if product is not None:
+            products.append(_product_dict(product, score))
+    if current is not None:
+        yield current, products
+
+# Get a specific session's history
 @app.get("/api/history/{session_id}")
 async def get_session_history(
     session_id: str,
-    db: AsyncSession = Depends(get_db),
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
+    """
+    Messages in (timestamp, id) order. `after` (a cursor from a previous
+    response) returns only newer messages; `limit` caps the page size.
+    format=ndjson streams one JSON object per line as rows come off the
+    database cursor: a "session" header line, then one "message" line each.
+    Archived sessions are restored to the hot table first (see app/db/archive.py).
+    """
     try:
-        res = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
-        session = res.scalars().first()
+        # Fresh read: the cached archived_at may be stale if another worker archived the session
+        session = await session_cache.load(db, session_id, fresh=True)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        
-        msg_res = await db.execute(
-            select(Message).where(Message.session_id == session.id).order_by(Message.timestamp)
-        )
-        messages = msg_res.scalars().all()
-        return {
+        if session.archived_at is not None:
+            # Bring the archived messages back; committed now so the ndjson stream's session sees them
+            await restore_session(db, session.id)
+            await db.commit()
+            session_cache.invalidate(session.id)
+
+        header = {
             "id": session.id,
             "car_details": {"manufacturer": session.manufacturer, "model": session.model, "year": session.year},
             "created_at": session.created_at.isoformat() if session.created_at else "",
             "text_size": session.text_size,
-            "messages": [
-                {
-                    "role": m.role,
-                    "content": m.content,
-                    "timestamp": m.timestamp.isoformat(),
-                    "products": json.loads(m.products) if m.products else None
-                }
-                for m in messages
-            ],
+        }
+
+        query = transcript_query(session.id, after=_decode_cursor(after) if after else None, limit=limit)
+
+        if format == "ndjson":
+            async def ndjson_rows():
+                yield json.dumps({"type": "session", **header}) + "\n"
+                # Own session: the request's one may be closed before the body is sent
+                async with AsyncSessionLocal() as stream_db:
+                    rows = await stream_db.stream(query.execution_options(yield_per=200))
+                    async for m, products in _fold_products(rows):
+                        yield json.dumps({"type": "message", **_message_dict(m, products)}) + "\n"
+
+            return StreamingResponse(ndjson_rows(), media_type="application/x-ndjson")
+
+        rows = await db.stream(query)
+        messages = [_message_dict(m, products) async for m, products in _fold_products(rows)]
+        return {
+            **header,
+            "messages": messages,
+            "next_cursor": messages[-1]["cursor"] if messages else after,
+            "has_more": bool(limit) and len(messages) == limit,
         }
     except HTTPException:
         raise
@@ -299,40 +576,59 @@ async def get_session_history(
         logger.error(f"Session history error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Clear all history
-@app.post("/api/clear-history")
+# Clear history in the background (all users, or one with ?user_id=); returns a job to poll
+@app.post("/api/clear-history", status_code=202)
 async def clear_history(
-    db: AsyncSession = Depends(get_db),
+    user_id: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
     try:
-        # Clear all messages
-        await db.execute(delete(Message))
-        # Clear all sessions
-        await db.execute(delete(ChatSession))
+        job = await create_job(db, user_id)
+        # The job runs outside this request, so it must be visible before it starts
         await db.commit()
-        return {"success": True}
+        start_job(job.id)
+        return {"success": True, **job_dict(job)}
     except Exception as e:
         logger.error(f"Clear history error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Clear-history job status
+@app.get("/api/clear-history/{job_id}")
+async def clear_history_status(
+    job_id: str,
+    db: AsyncSession = Depends(get_db, scope="function"),
+):
+    job = await db.get(PurgeJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_dict(job)
+
 # Image upload endpoint
 @app.post("/api/upload-image")
 async def upload_image(
     session_id: str = Form(...),
     file: UploadFile = File(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
+    """
+    Stream an image to content-addressed storage (see app/images.py). The
+    returned file_url is attached to the next chat message as `image_url`.
+    """
     try:
-        res = await db.execute(select(ChatSession).where(ChatSession.id == session_id))
-        session = res.scalars().first()
+        session = await session_cache.load(db, session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        
-        os.makedirs("static/uploads", exist_ok=True)
-        path = f"static/uploads/{session_id}_{file.filename}"
-        with open(path, "wb") as f:
-            f.write(await file.read())
-        return {"success": True, "file_url": f"/{path}"}
+        if file.content_type and not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="Please upload an image file")
+
+        saved = await save_upload(file)
+        return {"success": True, **saved}
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidImage:
+        raise HTTPException(status_code=400, detail="The file is not a readable image")
     except Exception as e:
         logger.error(f"Upload image error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
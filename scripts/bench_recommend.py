@@ -0,0 +1,98 @@
+"""
+Micro-benchmark for recommendation scoring on synthetic catalogs.
+
+Compares the previous path (cosine_similarity + full argsort + DataFrame.iloc
+rows) with the current one (sparse dot product + argpartition top-k + column
+lookups) at 10k, 100k and 1M products. No database needed.
+
+Run from the project root:  python scripts/bench_recommend.py [--sizes 10000 100000]
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+from app.recommend.recommend import ProductIndex, top_k_indices
+
+PARTS = ["brake pads", "brake rotors", "spark plugs", "oxygen sensor", "air filter", "oil filter",
+         "water pump", "timing belt", "ignition coil", "fuel injector", "alternator", "starter motor",
+         "radiator", "thermostat", "head gasket", "wheel bearing", "tie rod", "control arm",
+         "headlight assembly", "catalytic converter", "battery", "clutch kit", "cv joint", "strut"]
+MAKES = ["Toyota", "Honda", "Suzuki", "Nissan", "Hyundai", "Kia", "Ford", "Mazda"]
+QUERIES = [
+    "check engine light P0420 catalytic converter efficiency low",
+    "grinding noise when braking, replace brake pads and rotors",
+    "car cranks but will not start, test starter motor and battery",
+]
+
+def synthetic_index(n: int, rng) -> ProductIndex:
+    # Fit the vocabulary on a small corpus, then fake an n-row matrix with ~30 terms per row
+    corpus = [f"{rng.choice(PARTS)} {rng.choice(PARTS)} {rng.choice(MAKES)} genuine part" for _ in range(5000)]
+    vect = TfidfVectorizer(stop_words="english", ngram_range=(1, 3), max_features=10000)
+    vect.fit(corpus)
+    n_features = len(vect.vocabulary_)
+    per_row = min(30, n_features)
+    mat = sparse.csr_matrix(
+        (rng.random(n * per_row), rng.integers(0, n_features, n * per_row), np.arange(0, n * per_row + 1, per_row)),
+        shape=(n, n_features),
+    )
+    mat.sum_duplicates()
+    mat = normalize(mat)
+
+    columns = {
+        "id": [str(i) for i in range(n)],
+        "title": [f"Part {i}" for i in range(n)],
+        "manufacturer": [MAKES[i % len(MAKES)] for i in range(n)],
+        "url": [f"https://example.com/p/{i}" for i in range(n)],
+    }
+    prices = rng.uniform(500, 50000, n)
+    return ProductIndex(columns, prices, vect, mat, 1, datetime.now(timezone.utc))
+
+def old_path(index: ProductIndex, df: pd.DataFrame, query: str, top_k: int):
+    qv = index.vectorizer.transform([query])
+    sims = cosine_similarity(qv, index.matrix).flatten()
+    recs = []
+    for idx in sims.argsort()[:-top_k - 1:-1]:
+        row = df.iloc[idx]
+        recs.append({
+            "id": row["id"], "title": row["title"], "manufacturer": row["manufacturer"],
+            "price": float(row["price"]) if pd.notna(row["price"]) else None, "url": row["url"],
+        })
+    return recs
+
+def new_path(index: ProductIndex, query: str, top_k: int):
+    qv = index.vectorizer.transform([query])
+    sims = (index.matrix @ qv.T).toarray().ravel()
+    return index.results(top_k_indices(sims, top_k))
+
+def timeit(fn, repeat: int) -> float:
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'products':>10} {'old ms/query':>14} {'new ms/query':>14} {'speedup':>8}")
+    for n in args.sizes:
+        index = synthetic_index(n, rng)
+        df = pd.DataFrame({**index.columns, "price": index.prices})
+        old = timeit(lambda: [old_path(index, df, q, args.top_k) for q in QUERIES], args.repeat) / len(QUERIES)
+        new = timeit(lambda: [new_path(index, q, args.top_k) for q in QUERIES], args.repeat) / len(QUERIES)
+        print(f"{n:>10} {old:>14.2f} {new:>14.2f} {old / new:>7.1f}x")
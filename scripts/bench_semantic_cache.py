@@ -0,0 +1,77 @@
+"""
+Replay the saved chat transcripts in data/chat_history through the
+near-duplicate question cache (app/llm/semantic_cache.py).
+
+Sessions are replayed oldest first: each user question is looked up for its
+vehicle; a hit is an LLM call saved, a miss stores the recorded answer. Hit
+rate and lookup latency are reported per cosine threshold, and --show lists
+every hit so false matches can be eyeballed. No database or LLM needed.
+
+Run from the project root:  python scripts/bench_semantic_cache.py [--thresholds 0.7 0.8] [--all-turns] [--show]
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+from types import SimpleNamespace
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.llm.semantic_cache import SemanticCache, LLM_SEMANTIC_THRESHOLD
+
+def load_turns(directory: str, all_turns: bool) -> list[tuple]:
+    """(vehicle key, question, recorded answer) in replay order."""
+    sessions = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        with open(path) as f:
+            data = json.load(f)
+        if isinstance(data, dict) and "messages" in data:  # skip saved history listings
+            sessions.append(data)
+    sessions.sort(key=lambda s: s.get("created_at", ""))
+
+    turns = []
+    for session in sessions:
+        vehicle = SemanticCache.vehicle_key(SimpleNamespace(**session["car_details"]))
+        messages = session["messages"]
+        for i, msg in enumerate(messages):
+            if msg["role"] != "user":
+                continue
+            answer = next((m["content"] for m in messages[i + 1:] if m["role"] == "assistant"), None)
+            if answer:
+                turns.append((vehicle, msg["content"], answer))
+            if not all_turns:
+                break
+    return turns
+
+def replay(turns: list[tuple], threshold: float, show: bool) -> dict:
+    cache = SemanticCache(threshold=threshold, enabled=True)
+    lookup_time = 0.0
+    for vehicle, question, answer in turns:
+        start = time.perf_counter()
+        match = cache.lookup(vehicle, question)
+        lookup_time += time.perf_counter() - start
+        if match is None:
+            cache.add(vehicle, question, answer)
+        elif show:
+            print(f"    {match[2]:.2f}  {question[:45]!r} ~ {match[1][:45]!r}")
+    stats = cache.stats()
+    stats["lookup_ms"] = lookup_time / len(turns) * 1000 if turns else 0.0
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default="data/chat_history")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=sorted({0.6, 0.7, 0.8, 0.9, LLM_SEMANTIC_THRESHOLD}))
+    parser.add_argument("--all-turns", action="store_true", help="replay every user turn, not just first turns")
+    parser.add_argument("--show", action="store_true", help="print each hit with its similarity")
+    args = parser.parse_args()
+
+    turns = load_turns(args.dir, args.all_turns)
+    print(f"{len(turns)} questions from {args.dir}")
+    print(f"{'threshold':>10} {'hits':>6} {'misses':>7} {'hit rate':>9} {'ms/lookup':>10}")
+    for threshold in args.thresholds:
+        if args.show:
+            print(f"  threshold {threshold}:")
+        stats = replay(turns, threshold, args.show)
+        print(f"{threshold:>10.2f} {stats['hits']:>6} {stats['misses']:>7} {stats['hit_rate'] or 0:>9.1%} {stats['lookup_ms']:>10.3f}")
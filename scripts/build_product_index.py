@@ -0,0 +1,32 @@
+"""
+Offline build of the product search index.
+
+Fits TF-IDF over the products table and writes memory-mappable artifacts to
+INDEX_ARTIFACT_DIR (default data/index). Workers load these at startup
+instead of querying and refitting.
+
+Run from the project root:  python scripts/build_product_index.py
+"""
+import os
+import sys
+import time
+import asyncio
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.database import engine
+from app.recommend.recommend import rebuild_index, get_index
+from app.recommend.artifacts import INDEX_ARTIFACT_DIR
+
+async def build() -> bool:
+    ok = await rebuild_index(persist=True)
+    await engine.dispose()
+    return ok
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    if not asyncio.run(build()):
+        print("❌ Index build failed, see logs")
+        sys.exit(1)
+    info = get_index().info()
+    print(f"✅ Built index v{info['version']}: {info['products']} products, {info['features']} features "
+          f"in {time.perf_counter() - start:.1f}s -> {INDEX_ARTIFACT_DIR}")
@@ -0,0 +1,39 @@
+"""
+Check price parsing for catalog CSV uploads (app/db/catalog.py parse_prices)
+against the formats vendors send: currency prefixes with and without a dot,
+thousands separators and float-formatted numbers. No database needed.
+
+Run from the project root:  python scripts/check_catalog_prices.py
+Exit status is 1 on regression; CI runs it (.github/workflows/checks.yml).
+"""
+import os
+import sys
+import math
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pandas as pd
+
+from app.db.catalog import parse_prices
+
+# raw CSV value -> expected price (None: row skipped)
+CASES = [
+    ("Rs. 900", 900),
+    ("Rs.900/-", 900),
+    ("PKR 1,250", 1250),
+    ("1250.0", 1250),
+    (1250, 1250),
+    ("n/a", None),
+    (None, None),
+]
+
+def check() -> bool:
+    ok = True
+    parsed = parse_prices(pd.Series([raw for raw, _ in CASES], dtype=object))
+    for (raw, expected), got in zip(CASES, parsed):
+        good = math.isnan(got) if expected is None else got == expected
+        print(f"{'ok  ' if good else 'FAIL'}  {raw!r} -> {got}")
+        ok = ok and good
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check() else 1)
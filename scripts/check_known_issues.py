@@ -0,0 +1,41 @@
+"""
+Check direct answers from the known-issues database (app/llm/known_issues.py
+best_match) on data/car_issues_db.json: symptoms described positively or
+negatively ("no cooling", "AC is not cooling") must match the issue, while
+questions denying or dismissing its symptoms must not. No database or LLM needed.
+
+Run from the project root:  python scripts/check_known_issues.py
+Exit status is 1 on regression; CI runs it (.github/workflows/checks.yml).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.llm.known_issues import KnownIssues
+
+VEHICLE = ("Honda", "Civic", 2018)
+
+# (question, expected issue name or None)
+CASES = [
+    ("no cooling, AC compressor noise", "AC System Failure"),
+    ("AC is not cooling and the AC compressor makes a noise", "AC System Failure"),
+    ("weak cooling and a loud AC compressor noise", "AC System Failure"),
+    ("The AC isn't cooling at all, I hear AC compressor noise", "AC System Failure"),
+    ("I fixed the AC last week, there is no cooling problem and no compressor noise now. What about brakes?", None),
+    ("The AC compressor is not making noise and cooling is fine", None),
+    ("My brakes squeal when I stop", None),
+]
+
+def check() -> bool:
+    known_issues = KnownIssues.from_file()
+    ok = True
+    for question, expected in CASES:
+        issue = known_issues.best_match(question, *VEHICLE)
+        got = issue.name if issue else None
+        good = got == expected
+        print(f"{'ok  ' if good else 'FAIL'}  {question!r} -> {got}")
+        ok = ok and good
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check() else 1)
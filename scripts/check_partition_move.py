@@ -0,0 +1,67 @@
+"""
+Check that messages_ensure_partition keeps recommendations.
+
+When a month's partition is created after messages already landed in
+messages_default, the function moves them into the new partition. That move
+deletes from messages_default, which cascades to message_products, so the
+function has to put those rows back. This inserts a message (plus one
+recommendation) for a far-future month, creates the month's partition and
+checks both rows survived, all inside a transaction that is rolled back.
+
+Run against a migrated database:  python scripts/check_partition_move.py
+Exit status is 1 on regression; CI runs it (.github/workflows/checks.yml).
+"""
+import os
+import sys
+import uuid
+import asyncio
+from datetime import date, datetime, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.db.migrations import run_migrations
+
+# Far enough ahead that ensure_partitions never created it
+MONTH = date(2199, 1, 1)
+
+async def check() -> bool:
+    await run_migrations(engine)
+    session_id = f"check-{uuid.uuid4()}"
+    when = datetime(MONTH.year, MONTH.month, 15, tzinfo=timezone.utc)
+    async with engine.connect() as conn:
+        tx = await conn.begin()
+        try:
+            if await conn.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": f"messages_p{MONTH:%Y_%m}"}):
+                print(f"SKIP  partition for {MONTH:%Y-%m} already exists")
+                return True
+            await conn.execute(text(
+                "INSERT INTO chat_sessions (id, user_id, manufacturer, model, year, created_at) "
+                "VALUES (:id, 'check', 'Toyota', 'Corolla', 2018, now())"
+            ), {"id": session_id})
+            message_id = await conn.scalar(text(
+                "INSERT INTO messages (session_id, role, content, timestamp) "
+                "VALUES (:id, 'assistant', 'check', :ts) RETURNING id"
+            ), {"id": session_id, "ts": when})
+            await conn.execute(text(
+                "INSERT INTO message_products (message_id, message_timestamp, rank, product_id, score) "
+                "VALUES (:mid, :ts, 1, 'check-product', 0.5)"
+            ), {"mid": message_id, "ts": when})
+
+            before = await conn.scalar(text("SELECT tableoid::regclass::text FROM messages WHERE id = :mid"), {"mid": message_id})
+            await conn.execute(text("SELECT messages_ensure_partition(:month)"), {"month": MONTH})
+            after = await conn.scalar(text("SELECT tableoid::regclass::text FROM messages WHERE id = :mid"), {"mid": message_id})
+            kept = await conn.scalar(text(
+                "SELECT count(*) FROM message_products WHERE message_id = :mid AND product_id = 'check-product'"
+            ), {"mid": message_id})
+        finally:
+            await tx.rollback()
+    await engine.dispose()
+
+    ok = after == f"messages_p{MONTH:%Y_%m}" and kept == 1
+    print(f"{'ok  ' if ok else 'FAIL'}  message moved {before} -> {after}, recommendations kept: {kept}")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(check()) else 1)
@@ -0,0 +1,60 @@
+"""
+EXPLAIN-based regression check for the chat access paths.
+
+Runs EXPLAIN on the history, transcript, chat-context and top-products queries
+(built by app.queries, exactly as the app builds them) and fails if any of them
+reads messages (any partition), chat_sessions or message_products with a
+sequential scan. Sequential scans are
+disabled for the check, so a small dev database still reports whether an
+index *can* serve each query.
+
+Run against a migrated database:  python scripts/check_query_plans.py
+Exit status is 1 on regression; CI runs it (.github/workflows/checks.yml).
+"""
+import os
+import sys
+import json
+import asyncio
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.database import engine
+from app.db.migrations import run_migrations
+from app.queries import sample_queries
+
+WATCHED_TABLES = {"messages", "chat_sessions", "message_products"}
+
+def _watched(relation) -> bool:
+    # Plans name the monthly partitions (messages_p2025_01, messages_default), not messages
+    return relation in WATCHED_TABLES or (relation or "").startswith("messages_")
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+async def check() -> bool:
+    await run_migrations(engine)
+    ok = True
+    async with engine.connect() as conn:
+        await conn.execute(text("SET enable_seqscan = off"))
+        for name, query in sample_queries().items():
+            sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            raw = (await conn.execute(text("EXPLAIN (FORMAT JSON) " + sql))).scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+            scans = [
+                f"{node['Node Type']} on {node.get('Relation Name')}"
+                for node in _walk(plan)
+                if _watched(node.get("Relation Name"))
+            ]
+            bad = [scan for scan in scans if scan.startswith("Seq Scan")]
+            print(f"{'FAIL' if bad else 'ok  '}  {name}: {', '.join(scans)}")
+            ok = ok and not bad
+    await engine.dispose()
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(check()) else 1)
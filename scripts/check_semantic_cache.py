@@ -0,0 +1,43 @@
+"""
+Check the near-duplicate question cache (app/llm/semantic_cache.py) at its
+default threshold: paraphrases must still hit, and questions with the
+opposite meaning (a negation added or dropped) must never be served the
+stored answer. No database or LLM needed.
+
+Run from the project root:  python scripts/check_semantic_cache.py
+Exit status is 1 on regression; CI runs it (.github/workflows/checks.yml).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.llm.semantic_cache import SemanticCache
+
+VEHICLE = "2018 toyota corolla"
+
+# (stored question, new question, should it hit)
+CASES = [
+    ("car wont start clicking", "car won't start, clicking", True),
+    ("car wont start clicking", "clicking noise car not starting", True),
+    ("car wont start clicking", "car starts clicking", False),
+    ("car wont start clicking", "car won't start", False),
+    ("ac not cooling", "ac cooling", False),
+    ("no brake noise but pedal feels soft", "brake noise and pedal feels soft", False),
+    ("engine overheating in traffic", "engine is overheating in traffic", True),
+]
+
+def check() -> bool:
+    ok = True
+    for stored, question, expected in CASES:
+        cache = SemanticCache(enabled=True)
+        cache.add(VEHICLE, stored, "stored answer")
+        match = cache.lookup(VEHICLE, question)
+        hit = match is not None
+        good = hit == expected
+        similarity = f"{match[2]:.2f}" if hit else "-"
+        print(f"{'ok  ' if good else 'FAIL'}  {question!r} vs {stored!r}: {'hit' if hit else 'miss'} ({similarity})")
+        ok = ok and good
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check() else 1)
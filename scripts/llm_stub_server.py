@@ -0,0 +1,62 @@
+"""
+Minimal stand-in for the Groq chat completions API, for load testing.
+
+Run:  python scripts/llm_stub_server.py --port 9000 --delay 0.8
+Then start the app with GROQ_BASE_URL=http://127.0.0.1:9000 and hit /api/chat
+concurrently; throughput should scale with LLM_MAX_CONCURRENCY.
+"""
+import json
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "1. Check the battery terminals for corrosion.\n2. Test the starter relay."
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.8
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.delay)
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for word in REPLY.split(" "):
+                chunk = {
+                    "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        payload = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--delay", type=float, default=0.8, help="simulated model latency in seconds")
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"LLM stub listening on http://127.0.0.1:{args.port} (delay={args.delay}s)")
+    server.serve_forever()
@@ -0,0 +1,65 @@
+"""
+Nightly job: refresh the stored product recommendations on assistant messages.
+
+Walks the messages table in id order, scoring each page with one
+recommend_products_batch call instead of one query per message (each
+restricted to its session's make, as in chat), and replaces
+the page's message_products rows in one bulk delete and insert.
+
+Run from the project root:  python scripts/rescore_messages.py [--page-size 2000]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import delete, insert
+from sqlalchemy.future import select
+
+from app.database import AsyncSessionLocal, engine
+from app.models import ChatSession, Message, MessageProduct
+from app.recommend.recommend import recommend_products_batch, rebuild_index
+
+async def rescore(page_size: int, top_k: int):
+    await rebuild_index(persist=False)
+    last_id, total, start = 0, 0, time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        while True:
+            res = await db.execute(
+                select(Message.id, Message.timestamp, Message.content, ChatSession.manufacturer)
+                .join(ChatSession, ChatSession.id == Message.session_id)
+                .where(Message.role == "assistant", Message.id > last_id)
+                .order_by(Message.id)
+                .limit(page_size)
+            )
+            rows = res.all()
+            if not rows:
+                break
+
+            results = await asyncio.to_thread(
+                recommend_products_batch, [content for _, _, content, _ in rows], top_k, [make for *_, make in rows]
+            )
+            await db.execute(delete(MessageProduct).where(MessageProduct.message_id.in_([msg_id for msg_id, *_ in rows])))
+            recommendations = [
+                {"message_id": msg_id, "message_timestamp": ts, "rank": rank, "product_id": p["id"], "score": p.get("score")}
+                for (msg_id, ts, _, _), products in zip(rows, results)
+                for rank, p in enumerate(products, 1)
+            ]
+            if recommendations:
+                await db.execute(insert(MessageProduct), recommendations)
+            await db.commit()
+
+            last_id = rows[-1][0]
+            total += len(rows)
+            print(f"Rescored {total} messages ({total / (time.perf_counter() - start):.0f}/s)")
+    await engine.dispose()
+    print(f"✅ Rescored {total} messages")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page-size", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(rescore(args.page_size, args.top_k))
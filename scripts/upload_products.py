@@ -1,26 +1,21 @@
-import pandas as pd
-from sqlalchemy.orm import Session
-from db.connection import SessionLocal
-from models.db_models import Product
+"""
+Load a product catalog export into the products table.
 
-def upload_products(csv_file: str):
-    df = pd.read_csv(csv_file).fillna("")
-    db: Session = SessionLocal()
+Streams the CSV in chunks and bulk-loads it through a staging table; see
+app/db/catalog.py.
 
-    for _, row in df.iterrows():
-        product = Product(
-            title=row['title'],
-            price=str(row['Price']).replace("PKR", "").strip(),
-            manufacturer=row.get('manufacturer', ''),
-            details=row.get('details', ''),
-            url=row.get('url', '')
-        )
-        db.add(product)
-        print("✅ Added:", product.title)
+Run from the project root:  python scripts/upload_products.py [data/pakwheels_products.csv] [--keep-missing]
+"""
+import os
+import sys
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-    db.commit()
-    db.close()
-    print("✅ Upload complete.")
+from data_loader import upload_products
 
-# Run it
-upload_products("data/pakwheels_products.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("csv_file", nargs="?", default="data/pakwheels_products.csv")
+    parser.add_argument("--keep-missing", action="store_true", help="don't delete products absent from the file")
+    args = parser.parse_args()
+    sys.exit(0 if upload_products(args.csv_file, replace=not args.keep_missing) else 1)
@@ -80,6 +80,10 @@ document.addEventListener("DOMContentLoaded", () => {
   let selectedYear = null
   let isDarkTheme = localStorage.getItem("darkTheme") === "true"
   let isProcessing = false
+  // Position of the last message shown, used to fetch only newer ones
+  let transcriptCursor = null
+  // Uploaded image waiting to be attached to the next message
+  let pendingImageUrl = null
   let currentTextSize = localStorage.getItem("textSize") || "xxlarge"
 
   // Apply saved theme
@@ -325,6 +329,8 @@ document.addEventListener("DOMContentLoaded", () => {
       })
       .then((data) => {
         currentSessionId = data.session_id
+        transcriptCursor = null
+        pendingImageUrl = null
         localStorage.setItem("currentSessionId", currentSessionId)
 
         chatTitleText.textContent = `${year} ${manufacturer} ${model}`
@@ -401,7 +407,9 @@ document.addEventListener("DOMContentLoaded", () => {
     const message = userInput.value.trim()
     if (message === "") return
 
-    addMessage("user", message, new Date())
+    const imageUrl = pendingImageUrl
+    pendingImageUrl = null
+    addMessage("user", message, new Date(), imageUrl)
 
     userInput.value = ""
     userInput.style.height = "auto"
@@ -410,7 +418,10 @@ document.addEventListener("DOMContentLoaded", () => {
     isProcessing = true
     addTypingIndicator()
 
-    fetch("/api/chat", {
+    let streamingContent = null
+    let replyText = ""
+
+    fetch("/api/chat/stream", {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
@@ -418,22 +429,66 @@ document.addEventListener("DOMContentLoaded", () => {
       body: JSON.stringify({
         session_id: currentSessionId,
         message: message,
+        image_url: imageUrl,
       }),
     })
-      .then((response) => {
+      .then(async (response) => {
         if (!response.ok) {
           throw new Error(`HTTP error! Status: ${response.status}`)
         }
-        return response.json()
-      })
-      .then((data) => {
+
+        // Read Server-Sent Events as they arrive
+        const reader = response.body.getReader()
+        const decoder = new TextDecoder()
+        let buffer = ""
+        let products = null
+
+        while (true) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buffer += decoder.decode(value, { stream: true })
+
+          let boundary
+          while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, boundary)
+            buffer = buffer.slice(boundary + 2)
+
+            let eventName = "message"
+            let data = ""
+            rawEvent.split("\n").forEach((line) => {
+              if (line.startsWith("event: ")) eventName = line.slice(7)
+              else if (line.startsWith("data: ")) data += line.slice(6)
+            })
+            const payload = data ? JSON.parse(data) : null
+
+            if (eventName === "token") {
+              if (!streamingContent) {
+                removeTypingIndicator()
+                streamingContent = addStreamingMessage()
+              }
+              replyText += payload.content
+              streamingContent.innerHTML = replyText.replace(/\n/g, "<br>")
+              chatMessages.scrollTop = chatMessages.scrollHeight
+            } else if (eventName === "products") {
+              products = payload
+            } else if (eventName === "done") {
+              transcriptCursor = payload.cursor
+            } else if (eventName === "error") {
+              throw new Error(payload.detail)
+            }
+          }
+        }
+
+        // Replace the streaming bubble with the final message (with products)
         removeTypingIndicator()
-        addMessage("assistant", data.message, new Date(), null, data.products)
+        if (streamingContent) streamingContent.parentElement.remove()
+        addMessage("assistant", replyText, new Date(), null, products)
         isProcessing = false
       })
       .catch((error) => {
         console.error("Error sending message:", error)
         removeTypingIndicator()
+        if (streamingContent) streamingContent.parentElement.remove()
         addMessage(
           "assistant",
           "Sorry, I encountered an error processing your request. Please try again.",
@@ -444,6 +499,26 @@ document.addEventListener("DOMContentLoaded", () => {
       })
   }
 
+  // Add an empty assistant message that is filled in while the reply streams
+  function addStreamingMessage() {
+    const messageDiv = document.createElement("div")
+    messageDiv.className = "message assistant"
+
+    const avatarDiv = document.createElement("div")
+    avatarDiv.className = "message-avatar"
+    avatarDiv.innerHTML = '<i class="fas fa-robot"></i>'
+
+    const contentDiv = document.createElement("div")
+    contentDiv.className = "message-content"
+
+    messageDiv.appendChild(avatarDiv)
+    messageDiv.appendChild(contentDiv)
+
+    chatMessages.appendChild(messageDiv)
+    chatMessages.scrollTop = chatMessages.scrollHeight
+    return contentDiv
+  }
+
   // Add message to chat
   function addMessage(role, content, timestamp, carImage = null, products = null) {
     const messageDiv = document.createElement("div")
@@ -660,6 +735,8 @@ document.addEventListener("DOMContentLoaded", () => {
     selectedModel = null
     selectedYear = null
     currentSessionId = null
+    transcriptCursor = null
+    pendingImageUrl = null
     localStorage.removeItem("currentSessionId")
 
     chatMessages.innerHTML = ""
@@ -701,12 +778,13 @@ document.addEventListener("DOMContentLoaded", () => {
       })
       .then((data) => {
         if (data.success) {
-          showNotification("History cleared successfully", "success")
+          showNotification("Clearing history...", "info")
           historyList.innerHTML = '<div class="history-empty">No past conversations found</div>'
 
           if (currentSessionId) {
             resetChat()
           }
+          return waitForClearHistory(data.job_id)
         } else {
           showNotification("Failed to clear history", "error")
         }
@@ -717,9 +795,32 @@ document.addEventListener("DOMContentLoaded", () => {
       })
   }
 
+  // Poll a clear-history job until it finishes
+  function waitForClearHistory(jobId) {
+    return fetch(`/api/clear-history/${encodeURIComponent(jobId)}`)
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error(`HTTP error! Status: ${response.status}`)
+        }
+        return response.json()
+      })
+      .then((job) => {
+        if (job.status === "done") {
+          showNotification("History cleared successfully", "success")
+          loadChatHistory()
+        } else if (job.status === "failed") {
+          showNotification("Failed to clear history", "error")
+          loadChatHistory()
+        } else {
+          return new Promise((resolve) => setTimeout(resolve, 1000)).then(() => waitForClearHistory(jobId))
+        }
+      })
+  }
+
   // Load chat history
-  function loadChatHistory() {
-    fetch("/api/history")
+  function loadChatHistory(cursor = null) {
+    const url = cursor ? `/api/history?cursor=${encodeURIComponent(cursor)}` : "/api/history"
+    fetch(url)
       .then((response) => {
         if (!response.ok) {
           throw new Error(`HTTP error! Status: ${response.status}`)
@@ -727,8 +828,10 @@ document.addEventListener("DOMContentLoaded", () => {
         return response.json()
       })
       .then((data) => {
+        historyList.querySelector(".history-load-more")?.remove()
+
         if (data.sessions && data.sessions.length > 0) {
-          historyList.innerHTML = ""
+          if (!cursor) historyList.innerHTML = ""
 
           data.sessions.forEach((session) => {
             const historyItem = document.createElement("div")
@@ -764,7 +867,16 @@ document.addEventListener("DOMContentLoaded", () => {
 
             historyList.appendChild(historyItem)
           })
-        } else {
+
+          // Older sessions are fetched a page at a time
+          if (data.next_cursor) {
+            const loadMore = document.createElement("button")
+            loadMore.className = "history-load-more"
+            loadMore.textContent = "Load older conversations"
+            loadMore.addEventListener("click", () => loadChatHistory(data.next_cursor))
+            historyList.appendChild(loadMore)
+          }
+        } else if (!cursor) {
           historyList.innerHTML = '<div class="history-empty">No past conversations found</div>'
         }
       })
@@ -777,43 +889,78 @@ document.addEventListener("DOMContentLoaded", () => {
 
   // Load chat session
   function loadChatSession(sessionId) {
+    // Conversation already on screen: only fetch messages newer than what we have
+    if (sessionId === currentSessionId && transcriptCursor && chatMessages.childElementCount > 0) {
+      fetch(`/api/history/${sessionId}?after=${encodeURIComponent(transcriptCursor)}`)
+        .then((response) => {
+          if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`)
+          }
+          return response.json()
+        })
+        .then((data) => {
+          data.messages.forEach((msg) => {
+            addMessage(msg.role, msg.content, new Date(msg.timestamp), msg.car_image || null, msg.products || null)
+          })
+          if (data.next_cursor) transcriptCursor = data.next_cursor
+          finishSessionLoad(data)
+        })
+        .catch((error) => {
+          console.error("Error loading session:", error)
+          showNotification("Failed to load conversation", "error")
+        })
+      return
+    }
+
     showNotification("Loading conversation...", "info")
 
-    fetch(`/api/history/${sessionId}`)
-      .then((response) => {
+    // Full load, streamed as NDJSON so messages render as they arrive
+    fetch(`/api/history/${sessionId}?format=ndjson`)
+      .then(async (response) => {
         if (!response.ok) {
           throw new Error(`HTTP error! Status: ${response.status}`)
         }
-        return response.json()
-      })
-      .then((data) => {
-        currentSessionId = sessionId
-        localStorage.setItem("currentSessionId", sessionId)
-
-        selectedManufacturer = data.car_details.manufacturer
-        selectedModel = data.car_details.model
-        selectedYear = data.car_details.year
-
-        chatTitleText.textContent = `${selectedYear} ${selectedManufacturer} ${selectedModel}`
 
-        chatMessages.innerHTML = ""
+        const reader = response.body.getReader()
+        const decoder = new TextDecoder()
+        let buffer = ""
+        let header = null
+
+        const handleLine = (line) => {
+          if (!line) return
+          const row = JSON.parse(line)
+          if (row.type === "session") {
+            header = row
+            currentSessionId = sessionId
+            transcriptCursor = null
+            pendingImageUrl = null
+            localStorage.setItem("currentSessionId", sessionId)
+
+            selectedManufacturer = row.car_details.manufacturer
+            selectedModel = row.car_details.model
+            selectedYear = row.car_details.year
+
+            chatTitleText.textContent = `${selectedYear} ${selectedManufacturer} ${selectedModel}`
+            chatMessages.innerHTML = ""
+          } else if (row.type === "message") {
+            addMessage(row.role, row.content, new Date(row.timestamp), row.car_image || null, row.products || null)
+            transcriptCursor = row.cursor
+          }
+        }
 
-        data.messages.forEach((msg) => {
-          addMessage(msg.role, msg.content, new Date(msg.timestamp), msg.car_image || null, msg.products || null)
-        })
+        while (true) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buffer += decoder.decode(value, { stream: true })
+          const lines = buffer.split("\n")
+          buffer = lines.pop()
+          lines.forEach(handleLine)
+        }
+        handleLine(buffer)
 
         welcomeScreen.style.display = "none"
         chatInterface.style.display = "flex"
-
-        loadChatHistory()
-
-        if (data.text_size && data.text_size !== currentTextSize) {
-          setTextSize(data.text_size)
-        }
-
-        if (window.innerWidth < 992) {
-          sidebar.classList.remove("active")
-        }
+        finishSessionLoad(header)
       })
       .catch((error) => {
         console.error("Error loading session:", error)
@@ -821,6 +968,19 @@ document.addEventListener("DOMContentLoaded", () => {
       })
   }
 
+  // Shared tail of loadChatSession
+  function finishSessionLoad(data) {
+    loadChatHistory()
+
+    if (data && data.text_size && data.text_size !== currentTextSize) {
+      setTextSize(data.text_size)
+    }
+
+    if (window.innerWidth < 992) {
+      sidebar.classList.remove("active")
+    }
+  }
+
   // Handle image upload
   function handleImageUpload() {
     if (!currentSessionId || !imageUpload.files || !imageUpload.files[0]) {
@@ -874,6 +1034,7 @@ document.addEventListener("DOMContentLoaded", () => {
           uploadIndicator.classList.remove("show")
           setTimeout(() => uploadIndicator.remove(), 300)
 
+          pendingImageUrl = data.file_url
           showImageModal(data.file_url)
           showNotification("Image uploaded successfully", "success")
         } else {